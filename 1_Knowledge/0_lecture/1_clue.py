@@ -25,11 +25,13 @@ symbols = characters + rooms + weapons
 # If a symbol is known to be False, don't print it.
 # If model check returns False when checking symbol and it also returns False when checking Not(symbol),
 # then the KB does not contain enough information to draw an inference.
+# The KB is compiled once into a KnowledgeBase, instead of enumerating all models for every single query.
 def checkKnowledge(knowledge):
+    kb = KnowledgeBase(knowledge)
     for symbol in symbols:
-        if modelCheck(knowledge, symbol):
+        if kb.entails(symbol):
             print(f"{symbol}: YES")
-        elif not modelCheck(knowledge, Not(symbol)):
+        elif not kb.entails(Not(symbol)):
             print(f"{symbol}: MAYBE")
 
 
@@ -1,4 +1,5 @@
 import itertools
+import multiprocessing
 
 
 class Sentence():
@@ -225,39 +226,311 @@ class Biconditional(Sentence):
         return set.union(self.left.symbols(), self.right.symbols())
 
 
-def modelCheck(knowledge, query):
-    """Checks if knowledge base entails query."""
+def checkAll(knowledge, query, symbols, model):
+    """Checks if knowledge base entails query, given a particular model."""
 
-    def checkAll(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+    # If model has an assignment for each symbol
+    if not symbols:
 
-        # If model has an assignment for each symbol
-        if not symbols:
+        # If knowledge base is true in model, then query must also be true
+        if knowledge.evaluate(model):
+            return query.evaluate(model)
+        return True
+    else:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
+        # Choose one of the remaining unused symbols
+        remaining = symbols.copy()
+        p = remaining.pop()
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
+        # Create a model where the symbol is true
+        model_true = model.copy()
+        model_true[p] = True
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
+        # Create a model where the symbol is false
+        model_false = model.copy()
+        model_false[p] = False
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+        # Ensure entailment holds in both models
+        return (checkAll(knowledge, query, remaining, model_true) and
+                checkAll(knowledge, query, remaining, model_false))
 
-            # Ensure entailment holds in both models
-            return (checkAll(knowledge, query, remaining, model_true) and
-                    checkAll(knowledge, query, remaining, model_false))
+
+def modelCheck(knowledge, query):
+    """Checks if knowledge base entails query."""
 
     # Get all symbols in both knowledge and query
     symbols = set.union(knowledge.symbols(), query.symbols())
 
     # Check that knowledge entails query
     return checkAll(knowledge, query, symbols, dict())
+
+
+# Parallel Model Check:
+# The 2^n models are split into 2^k partitions by fixing the truth values of the first k symbols.
+# Partition i assigns True to the j-th fixed symbol, if bit j of i is set.
+# Every partition is checked by checkAll in a separate process.
+# As soon as one worker finds a model where the KB is true but the query is false, the remaining workers are stopped.
+def modelCheckParallel(knowledge, query, processes=None, split_symbols=None):
+    """Checks if knowledge base entails query, using a process pool."""
+
+    # Sort the symbols, so that every worker fixes the same symbols.
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    processes = processes or multiprocessing.cpu_count()
+
+    # Use a few partitions per process, so that the work is evenly distributed.
+    if split_symbols is None:
+        split_symbols = (4 * processes - 1).bit_length()
+    split_symbols = min(split_symbols, len(symbols))
+    fixed = symbols[:split_symbols]
+    remaining = set(symbols[split_symbols:])
+
+    partitions = (
+        (remaining, {p: bool(i >> j & 1) for j, p in enumerate(fixed)})
+        for i in range(2 ** len(fixed))
+    )
+    with multiprocessing.Pool(processes, initializer=initPartitionWorker, initargs=(knowledge, query)) as pool:
+        for entailed in pool.imap_unordered(checkPartition, partitions):
+            # Leaving the with block terminates the pool and all running workers.
+            if not entailed:
+                return False
+    return True
+
+
+# The KB and query are sent to every worker process only once.
+worker_sentences = None
+
+
+def initPartitionWorker(knowledge, query):
+    global worker_sentences
+    worker_sentences = (knowledge, query)
+
+
+def checkPartition(partition):
+    """Checks if knowledge base entails query in all models of a partition."""
+    knowledge, query = worker_sentences
+    remaining, model = partition
+    return checkAll(knowledge, query, remaining, model)
+
+
+# Persistent Knowledge Base:
+# modelCheck evaluates the whole sentence tree in all 2^n models for every query.
+# KnowledgeBase compiles every sentence once into conjunctive normal form (CNF) by the Tseitin transformation
+# (every compound sub-sentence gets an auxiliary variable, so the CNF grows linearly with the sentence size).
+# The clauses are kept in a DPLL solver with watched literals. Adding a new fact only appends its clauses.
+# A query is answered by solving under the assumption ¬query:
+# If KB ∧ ¬query is unsatisfiable, then KB entails query.
+class KnowledgeBase():
+    """
+    Incremental knowledge base that answers entailment queries with a SAT solver.
+    Sentences must not be modified after they were added to the knowledge base.
+    """
+
+    def __init__(self, *sentences):
+        # Map symbol names and compiled sub-sentences to (positive) integer variables.
+        # A literal is a variable (true) or a negated variable (false).
+        self.variables = dict()
+        self.encoded = dict()
+        self.num_variables = 0
+
+        # Clause database. Clauses with one literal are kept separately, because they can't be watched.
+        # If an empty clause was derived, the KB is inconsistent (no model satisfies it).
+        self.clauses = []
+        self.units = []
+        self.inconsistent = False
+
+        # Map every literal to the indices of the clauses that watch it.
+        # Every clause watches its first 2 literals.
+        self.watches = dict()
+
+        # Truth value of every variable during a solve: 1 (true), -1 (false), 0 (unassigned).
+        self.assignment = [0]
+
+        # Variable 1 represents the constant True (e.g. for an empty And()).
+        self.true = self.newVariable()
+        self.addClause([self.true])
+
+        for sentence in sentences:
+            self.add(sentence)
+
+    def newVariable(self):
+        self.num_variables += 1
+        self.assignment.append(0)
+        return self.num_variables
+
+    def addClause(self, clause):
+        """Adds a clause (list of literals) to the clause database."""
+        clause = list(dict.fromkeys(clause))
+        # A clause containing a literal and its negation is always true.
+        if any(-literal in clause for literal in clause):
+            return
+        if not clause:
+            self.inconsistent = True
+        elif len(clause) == 1:
+            self.units.append(clause[0])
+        else:
+            index = len(self.clauses)
+            self.clauses.append(clause)
+            self.watches.setdefault(clause[0], []).append(index)
+            self.watches.setdefault(clause[1], []).append(index)
+
+    def encode(self, sentence):
+        """
+        Returns a literal that is equivalent to the sentence.
+        Compound sentences get a new variable and defining clauses (Tseitin transformation).
+        """
+        if isinstance(sentence, Symbol):
+            if sentence.name not in self.variables:
+                self.variables[sentence.name] = self.newVariable()
+            return self.variables[sentence.name]
+        if isinstance(sentence, Not):
+            return -self.encode(sentence.operand)
+        if sentence in self.encoded:
+            return self.encoded[sentence]
+
+        if isinstance(sentence, And):
+            literals = [self.encode(conjunct) for conjunct in sentence.conjuncts]
+            x = self.newVariable()
+            # x → each conjunct, (all conjuncts) → x
+            for literal in literals:
+                self.addClause([-x, literal])
+            self.addClause([x] + [-literal for literal in literals])
+        elif isinstance(sentence, Or):
+            literals = [self.encode(disjunct) for disjunct in sentence.disjuncts]
+            x = self.newVariable()
+            # x → (any disjunct), each disjunct → x
+            self.addClause([-x] + literals)
+            for literal in literals:
+                self.addClause([x, -literal])
+        elif isinstance(sentence, Implication):
+            a = self.encode(sentence.antecedent)
+            b = self.encode(sentence.consequent)
+            x = self.newVariable()
+            # x ↔ (¬a ∨ b)
+            self.addClause([-x, -a, b])
+            self.addClause([x, a])
+            self.addClause([x, -b])
+        elif isinstance(sentence, Biconditional):
+            a = self.encode(sentence.left)
+            b = self.encode(sentence.right)
+            x = self.newVariable()
+            # x ↔ (a ↔ b)
+            self.addClause([-x, -a, b])
+            self.addClause([-x, a, -b])
+            self.addClause([x, a, b])
+            self.addClause([x, -a, -b])
+        else:
+            raise TypeError("must be a logical sentence")
+
+        self.encoded[sentence] = x
+        return x
+
+    def add(self, sentence):
+        """Adds a sentence (fact) to the knowledge base."""
+        Sentence.validate(sentence)
+        # Top level conjunctions and clauses are asserted directly, without auxiliary variables.
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.addClause([self.encode(disjunct) for disjunct in sentence.disjuncts])
+        elif isinstance(sentence, Implication):
+            self.addClause([-self.encode(sentence.antecedent), self.encode(sentence.consequent)])
+        else:
+            self.addClause([self.encode(sentence)])
+
+    def assign(self, literal, trail):
+        """Makes the literal true. Returns False if the literal is already false."""
+        value = self.assignment[abs(literal)]
+        if value:
+            return (value > 0) == (literal > 0)
+        self.assignment[abs(literal)] = 1 if literal > 0 else -1
+        trail.append(literal)
+        return True
+
+    def value(self, literal):
+        value = self.assignment[abs(literal)]
+        return value if literal > 0 else -value
+
+    def propagate(self, trail, head):
+        """
+        Unit propagation of all literals on the trail starting at index head.
+        Only clauses that watch a literal that became false need to be visited.
+        Returns False on a conflict.
+        """
+        while head < len(trail):
+            false_literal = -trail[head]
+            head += 1
+            watching = self.watches.get(false_literal, [])
+            i = 0
+            while i < len(watching):
+                clause = self.clauses[watching[i]]
+                # The false literal is moved to the second position.
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], clause[0]
+                # The clause is already satisfied by the other watched literal.
+                if self.value(clause[0]) > 0:
+                    i += 1
+                    continue
+                # Look for a new literal to watch that is not false.
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) >= 0:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(watching[i])
+                        watching[i] = watching[-1]
+                        watching.pop()
+                        break
+                else:
+                    # All other literals are false: the clause is unit (or in conflict).
+                    if not self.assign(clause[0], trail):
+                        return False
+                    i += 1
+        return True
+
+    def satisfiable(self, *assumptions):
+        """
+        Checks if the knowledge base is satisfiable, given that all assumptions (sentences) are true.
+        DPLL search with chronological backtracking.
+        """
+        if self.inconsistent:
+            return False
+        assumed = [self.encode(assumption) for assumption in assumptions]
+
+        # The watched literals don't need to be restored when backtracking,
+        # so every solve starts from an empty assignment with the compiled clause database.
+        self.assignment = [0] * (self.num_variables + 1)
+        trail = []
+        if not all(self.assign(literal, trail) for literal in self.units + assumed):
+            return False
+        if not self.propagate(trail, 0):
+            return False
+
+        # Every decision is saved as (trail length before the decision, literal, both values tried).
+        decisions = []
+        variable = 1
+        while True:
+            # Choose the next unassigned variable.
+            while variable <= self.num_variables and self.assignment[variable]:
+                variable += 1
+            if variable > self.num_variables:
+                return True
+            decisions.append((len(trail), -variable, False))
+            self.assign(-variable, trail)
+            conflict = not self.propagate(trail, len(trail) - 1)
+
+            while conflict:
+                # Undo the last decision that was not tried with both values and try the opposite value.
+                if not decisions:
+                    return False
+                position, literal, flipped = decisions.pop()
+                for undo in trail[position:]:
+                    self.assignment[abs(undo)] = 0
+                del trail[position:]
+                variable = min(variable, abs(literal))
+                if not flipped:
+                    decisions.append((position, -literal, True))
+                    self.assign(-literal, trail)
+                    conflict = not self.propagate(trail, position)
+
+    def entails(self, query):
+        """Checks if the knowledge base entails query (same result as modelCheck)."""
+        return not self.satisfiable(Not(query))
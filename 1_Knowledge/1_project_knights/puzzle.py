@@ -93,8 +93,9 @@ def main():
     symbols = [AKnight, AKnave, BKnight, BKnave, CKnight, CKnave]
     for i in range(num_puzzles):
         print(f"Puzzle {i}")
+        kb = KnowledgeBase(knowledge_puz[i])
         for symbol in symbols:
-            if modelCheck(knowledge_puz[i], symbol):
+            if kb.entails(symbol):
                 print(f"    {symbol}")
 
 
@@ -0,0 +1,21 @@
+from native_model import model
+
+# Same query as in 1_inference.py, answered by variable elimination in the in-repo BayesianNetwork.
+# A whole batch of evidence dicts is answered with one call.
+evidence_batch = [
+    {"train": "delayed"},
+    {"train": "delayed", "rain": "heavy"},
+    {"appointment": "miss"},
+    {}
+]
+predictions = model.predictProbaBatch(evidence_batch)
+
+for evidence, prediction in zip(evidence_batch, predictions):
+    print(f"Evidence: {evidence}")
+    for node, distribution in prediction.items():
+        if isinstance(distribution, str):
+            print(f"{node}: {distribution}")
+        else:
+            print(f"{node}")
+            for value, probability in distribution.items():
+                print(f"    {value}: {probability:.4f}")
@@ -0,0 +1,17 @@
+from native_model import model
+
+# Same query as in 2_sample.py: distribution of Appointment given that the train is delayed.
+# Instead of rejection sampling (which throws away all samples where the train is not delayed),
+# likelihood weighting and Gibbs sampling use every sample.
+N = 1000000
+evidence = {"train": "delayed"}
+
+distributions, effective_sample_size = model.likelihoodWeighting(evidence, N, seed=0)
+print(f"Likelihood Weighting (effective sample size: {effective_sample_size:.0f})")
+for value, probability in distributions["appointment"].items():
+    print(f"    {value}: {probability:.4f}")
+
+distributions, effective_sample_size = model.gibbsSampling(evidence, N, seed=0)
+print(f"Gibbs Sampling (effective sample size: {effective_sample_size:.0f})")
+for value, probability in distributions["appointment"].items():
+    print(f"    {value}: {probability:.4f}")
@@ -0,0 +1,287 @@
+import numpy as np
+
+# Discrete Bayesian Network without pomegranate.
+# Every node stores its conditional probability table (CPT) P(Node | Parents(Node)) as a NumPy array
+# with one axis per parent (indexed by the parent's value) and a last axis for the node's own value.
+# E.g. the table of Train has the shape (3, 2, 2): table[rain, maintenance, train].
+
+# Inference by Variable Elimination:
+# Inference by enumeration sums the joint probability over all values of all hidden variables.
+# Because the joint probability is a product of CPTs, a hidden variable can be summed out by
+# multiplying only the factors that contain it. The result is a new factor over its neighbors.
+# The order in which the variables are eliminated only depends on the network structure,
+# so it is computed once for every query variable and cached.
+# Evidence is an indicator factor over the observed variable (1 for the observed value, 0 otherwise).
+# For a batch of evidence dicts, every evidence factor gets an additional axis for the batch,
+# so that all queries are answered by the same sequence of array operations.
+
+# Vectorized Sampling:
+# All samplers draw a whole batch of samples at once. A sample is stored as one array of value indices per node.
+# The value of a node is drawn from the cumulative probabilities of the CPT row selected by its parents' values:
+# the index of the first cumulative probability that is larger than a uniform random number.
+# Likelihood Weighting: evidence nodes are fixed to their observed value instead of being sampled.
+# Every sample is weighted by the probability of the evidence given its sampled parents.
+# No sample is rejected, but samples with very small weights contribute little.
+# The effective sample size (sum of weights)² / sum of squared weights measures how many
+# unweighted samples the weighted samples are worth.
+# Gibbs Sampling: many Markov chains run in parallel. In every step, each non-evidence node is resampled given
+# all other nodes, which only depends on its Markov blanket (parents, children and the children's parents):
+# P(X | blanket) ∝ P(X | Parents(X)) * product_over_children_C( P(C | Parents(C)) )
+# The effective sample size is estimated from the variance of the estimates of the individual chains.
+
+
+class BayesianNetwork():
+    def __init__(self):
+        # Node names in topological order (parents are always added before their children)
+        self.nodes = []
+        self.values = dict()
+        self.parents = dict()
+        self.tables = dict()
+        # Cached elimination order for every query variable
+        self.elimination_orders = dict()
+
+    def addDistribution(self, name, distribution):
+        """
+        Add a root node with a probability distribution {value: probability}.
+        """
+        self.addNode(name, list(distribution), [], np.array(list(distribution.values()), dtype=np.float64))
+
+    def addConditional(self, name, rows, parents):
+        """
+        Add a node that is conditional on the parent nodes.
+        Every row of the CPT is a list [parent values..., value, probability]
+        (the same format as pomegranate.ConditionalProbabilityTable).
+        """
+        for parent in parents:
+            if parent not in self.values:
+                raise ValueError(f"parent {parent} must be added before node {name}")
+        values = list(dict.fromkeys(row[-2] for row in rows))
+        shape = [len(self.values[parent]) for parent in parents] + [len(values)]
+        table = np.zeros(shape)
+        for row in rows:
+            index = tuple(self.values[parent].index(value) for parent, value in zip(parents, row[:-2]))
+            table[index + (values.index(row[-2]),)] = row[-1]
+        self.addNode(name, values, list(parents), table)
+
+    def addNode(self, name, values, parents, table):
+        self.nodes.append(name)
+        self.values[name] = values
+        self.parents[name] = parents
+        self.tables[name] = table
+        self.elimination_orders = dict()
+
+    def nodeTable(self, node, samples, n):
+        """
+        Return the CPT row of the node for each of the n samples, selected by the parent values in samples
+        (dict that maps nodes to arrays of value indices), as an array of shape (n, number of values).
+        """
+        if not self.parents[node]:
+            return np.broadcast_to(self.tables[node], (n, len(self.values[node])))
+        return self.tables[node][tuple(samples[parent] for parent in self.parents[node])]
+
+    def sampleValues(self, table, rng):
+        """
+        Return one value index per row of table (unnormalized probabilities of shape (n, number of values)).
+        """
+        cumulative = np.cumsum(table, axis=1)
+        random = rng.random(len(cumulative)) * cumulative[:, -1]
+        return (random[:, np.newaxis] >= cumulative[:, :-1]).sum(axis=1)
+
+    def sample(self, n, seed=None):
+        """
+        Return n samples drawn from the network (ancestral sampling)
+        as a dict that maps every node to an array of value indices.
+        """
+        rng = np.random.default_rng(seed)
+        samples = dict()
+        for node in self.nodes:
+            samples[node] = self.sampleValues(self.nodeTable(node, samples, n), rng)
+        return samples
+
+    def distributions(self, evidence, counts):
+        """
+        Convert (weighted) counts of the value indices of every node to the format of predictProba.
+        """
+        return {
+            node: evidence[node] if node in evidence
+            else dict(zip(self.values[node], (counts[node] / counts[node].sum()).tolist()))
+            for node in self.nodes
+        }
+
+    def likelihoodWeighting(self, evidence, n, seed=None):
+        """
+        Return the probability distribution of every node given the evidence, estimated from n weighted samples,
+        and the effective sample size.
+        """
+        rng = np.random.default_rng(seed)
+        samples = dict()
+        weights = np.ones(n)
+        for node in self.nodes:
+            table = self.nodeTable(node, samples, n)
+            if node in evidence:
+                value = self.values[node].index(evidence[node])
+                samples[node] = np.full(n, value)
+                weights = weights * table[:, value]
+            else:
+                samples[node] = self.sampleValues(table, rng)
+
+        if not weights.any():
+            raise ValueError("evidence has probability 0 in all samples")
+        counts = {
+            node: np.bincount(samples[node], weights=weights, minlength=len(self.values[node]))
+            for node in self.nodes
+        }
+        effective_sample_size = weights.sum() ** 2 / (weights ** 2).sum()
+        return self.distributions(evidence, counts), float(effective_sample_size)
+
+    def gibbsSampling(self, evidence, n, chains=1000, burn_in=100, seed=None):
+        """
+        Return the probability distribution of every node given the evidence, estimated from (at least) n samples
+        of `chains` parallel Gibbs chains after burn_in steps, and the effective sample size
+        (the smallest one of all node values).
+        """
+        rng = np.random.default_rng(seed)
+        children = {node: [child for child in self.nodes if node in self.parents[child]] for node in self.nodes}
+        hidden = [node for node in self.nodes if node not in evidence]
+
+        # Start every chain from a sample that agrees with the evidence.
+        samples = dict()
+        for node in self.nodes:
+            if node in evidence:
+                samples[node] = np.full(chains, self.values[node].index(evidence[node]))
+            else:
+                samples[node] = self.sampleValues(self.nodeTable(node, samples, chains), rng)
+
+        steps = -(-n // chains)
+        chain_counts = {node: np.zeros((chains, len(self.values[node]))) for node in self.nodes}
+        chain_index = np.arange(chains)
+        for step in range(burn_in + steps):
+            for node in hidden:
+                # P(node | Markov blanket) for every chain (rows) and every value of the node (columns)
+                table = self.nodeTable(node, samples, chains)
+                values = np.arange(len(self.values[node]))[np.newaxis, :]
+                for child in children[node]:
+                    index = [
+                        values if p == node else samples[p][:, np.newaxis]
+                        for p in self.parents[child] + [child]
+                    ]
+                    table = table * self.tables[child][tuple(index)]
+                samples[node] = self.sampleValues(table, rng)
+            if step >= burn_in:
+                for node in self.nodes:
+                    chain_counts[node][chain_index, samples[node]] += 1
+
+        counts = {node: chain_counts[node].sum(axis=0) for node in self.nodes}
+
+        # Var(estimate of one chain) = Var(value) / (effective samples of one chain)
+        effective_sample_size = chains * steps
+        for node in hidden:
+            probability = counts[node] / counts[node].sum()
+            chain_variance = (chain_counts[node] / steps).var(axis=0, ddof=1) if chains > 1 else np.zeros(1)
+            for p, variance in zip(probability, chain_variance):
+                if variance > 0:
+                    effective_sample_size = min(effective_sample_size, chains * p * (1 - p) / variance)
+        return self.distributions(evidence, counts), float(effective_sample_size)
+
+    def probability(self, sample):
+        """
+        Return the joint probability of a sample (dict that maps every node to a value).
+        """
+        probability = 1
+        for node in self.nodes:
+            index = tuple(self.values[n].index(sample[n]) for n in self.parents[node] + [node])
+            probability *= self.tables[node][index]
+        return float(probability)
+
+    def eliminationOrder(self, query):
+        """
+        Return the order in which all other nodes are eliminated when query is the query variable.
+        Min-degree heuristic on the moral graph (every node is connected to its parents,
+        the parents of a node are connected to each other).
+        """
+        if query not in self.elimination_orders:
+            neighbors = {node: set() for node in self.nodes}
+            for node in self.nodes:
+                family = set(self.parents[node]) | {node}
+                for member in family:
+                    neighbors[member] |= family - {member}
+            order = []
+            remaining = set(self.nodes) - {query}
+            while remaining:
+                node = min(remaining, key=lambda n: (len(neighbors[n]), self.nodes.index(n)))
+                for neighbor in neighbors[node]:
+                    neighbors[neighbor] |= neighbors[node] - {neighbor}
+                    neighbors[neighbor].discard(node)
+                remaining.remove(node)
+                order.append(node)
+            self.elimination_orders[query] = order
+        return self.elimination_orders[query]
+
+    def evidenceFactors(self, evidence_batch):
+        """
+        Return an indicator array of shape (batch size, number of values) for every observed node.
+        """
+        factors = dict()
+        for node in self.nodes:
+            if not any(node in evidence for evidence in evidence_batch):
+                continue
+            indicator = np.ones((len(evidence_batch), len(self.values[node])))
+            for i, evidence in enumerate(evidence_batch):
+                if node in evidence:
+                    indicator[i] = 0
+                    indicator[i, self.values[node].index(evidence[node])] = 1
+            factors[node] = indicator
+        return factors
+
+    def marginal(self, query, evidence_factors, batch_size):
+        """
+        Return P(query | evidence) for every evidence of the batch, as an array of shape (batch size, values).
+        """
+        # Every factor is (array, list of axis labels). Label "batch" is the axis of the evidence batch.
+        factors = [(self.tables[node], self.parents[node] + [node]) for node in self.nodes]
+        factors += [(indicator, ["batch", node]) for node, indicator in evidence_factors.items()]
+        factors.append((np.ones(batch_size), ["batch"]))
+
+        for node in self.eliminationOrder(query) + [None]:
+            # Multiply all factors containing the node and sum it out.
+            # Finally (node None), multiply all remaining factors.
+            involved = [factor for factor in factors if node is None or node in factor[1]]
+            factors = [factor for factor in factors if node is not None and node not in factor[1]]
+            labels = list(dict.fromkeys(label for _, factor_labels in involved for label in factor_labels))
+            if node is None:
+                labels = ["batch", query]
+            keep = [label for label in labels if label != node]
+            index = {label: i for i, label in enumerate(labels)}
+            operands = []
+            for array, factor_labels in involved:
+                operands += [array, [index[label] for label in factor_labels]]
+            factors.append((np.einsum(*operands, [index[label] for label in keep]), keep))
+
+        joint = factors[0][0]
+        evidence_probability = joint.sum(axis=1, keepdims=True)
+        if not evidence_probability.all():
+            raise ValueError("evidence has probability 0")
+        return joint / evidence_probability
+
+    def predictProbaBatch(self, evidence_batch):
+        """
+        Return the probability distribution of every node for every evidence dict of the batch.
+        For every evidence, return a dict that maps each node to the observed value,
+        or to a dict {value: probability} if the node was not observed.
+        """
+        evidence_factors = self.evidenceFactors(evidence_batch)
+        predictions = [dict() for _ in evidence_batch]
+        for node in self.nodes:
+            distributions = self.marginal(node, evidence_factors, len(evidence_batch))
+            for i, evidence in enumerate(evidence_batch):
+                if node in evidence:
+                    predictions[i][node] = evidence[node]
+                else:
+                    predictions[i][node] = dict(zip(self.values[node], distributions[i].tolist()))
+        return predictions
+
+    def predictProba(self, evidence):
+        """
+        Return the probability distribution of every node, given the evidence (dict of observed values).
+        """
+        return self.predictProbaBatch([evidence])[0]
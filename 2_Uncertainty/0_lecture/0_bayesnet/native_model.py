@@ -0,0 +1,47 @@
+from bayesnet import BayesianNetwork
+
+# The same network as in model.py, built with the in-repo BayesianNetwork instead of pomegranate.
+# The CPT rows have the same format as the rows of pomegranate.ConditionalProbabilityTable.
+
+model = BayesianNetwork()
+
+# Rain is the root node and has no parents
+model.addDistribution("rain", {
+    "none": 0.7,
+    "light": 0.2,
+    "heavy": 0.1
+})
+
+# Track maintenance node is conditional on rain
+model.addConditional("maintenance", [
+    ["none", "yes", 0.4],
+    ["none", "no", 0.6],
+    ["light", "yes", 0.2],
+    ["light", "no", 0.8],
+    ["heavy", "yes", 0.1],
+    ["heavy", "no", 0.9]
+], ["rain"])
+
+# Train node is conditional on rain and maintenance
+model.addConditional("train", [
+    ["none", "yes", "on time", 0.8],
+    ["none", "yes", "delayed", 0.2],
+    ["none", "no", "on time", 0.9],
+    ["none", "no", "delayed", 0.1],
+    ["light", "yes", "on time", 0.6],
+    ["light", "yes", "delayed", 0.4],
+    ["light", "no", "on time", 0.7],
+    ["light", "no", "delayed", 0.3],
+    ["heavy", "yes", "on time", 0.4],
+    ["heavy", "yes", "delayed", 0.6],
+    ["heavy", "no", "on time", 0.5],
+    ["heavy", "no", "delayed", 0.5],
+], ["rain", "maintenance"])
+
+# Appointment node is conditional on train
+model.addConditional("appointment", [
+    ["on time", "attend", 0.9],
+    ["on time", "miss", 0.1],
+    ["delayed", "attend", 0.6],
+    ["delayed", "miss", 0.4]
+], ["train"])
@@ -0,0 +1,88 @@
+import bisect
+
+import numpy as np
+
+# Markov Chain Engine:
+# The transition model is stored as a matrix: transitions[i, j] = P(X_t+1 = j | X_t = i).
+# Sampling: the next state of a chain in state i is the index of the first cumulative probability of row i
+# that is larger than a uniform random number. All chains are advanced with one array operation per step.
+# Distribution after n steps: P(X_n) = P(X_0) · transitions^n
+# Stationary distribution π: the distribution that does not change anymore by a transition (π = π · transitions).
+# π is the left eigenvector of the transition matrix for the eigenvalue 1 (normalized to sum 1).
+
+
+def transitionMatrix(rows):
+    """
+    Return the transition matrix and the state names from the rows [state, next state, probability]
+    of a pomegranate.ConditionalProbabilityTable.
+    """
+    states = list(dict.fromkeys(state for row in rows for state in row[:2]))
+    index = {state: i for i, state in enumerate(states)}
+    transitions = np.zeros((len(states), len(states)))
+    for state, next_state, probability in rows:
+        transitions[index[state], index[next_state]] = probability
+    return transitions, states
+
+
+class MarkovChain():
+    def __init__(self, transitions, start, states):
+        self.transitions = np.asarray(transitions, dtype=np.float64)
+        self.cumulative = np.cumsum(self.transitions, axis=1)
+        self.states = list(states)
+        # start can be a dict {state: probability} (like the parameters of a pomegranate.DiscreteDistribution)
+        if isinstance(start, dict):
+            start = [start.get(state, 0) for state in self.states]
+        self.start = np.asarray(start, dtype=np.float64)
+
+    def sample(self, steps, chains=1, seed=None, block_size=65536):
+        """
+        Return the state indices of `chains` independent chains with `steps` states each,
+        as an array of shape (chains, steps).
+        """
+        rng = np.random.default_rng(seed)
+        num_states = len(self.states)
+        samples = np.empty((steps, chains), dtype=np.int64)
+        if not steps:
+            return samples.T
+        start_cumulative = np.cumsum(self.start) / self.start.sum()
+        samples[0] = np.minimum(np.searchsorted(start_cumulative, rng.random(chains), side="right"), num_states - 1)
+
+        # Row i of the cumulative probabilities is shifted by i and all rows are concatenated,
+        # so that the next state of all chains is found by one binary search: state i with random number u
+        # is looked up as i + u, which can only fall into row i.
+        cumulative = self.cumulative / self.cumulative[:, -1:]
+        shifted = (cumulative + np.arange(num_states)[:, np.newaxis]).ravel()
+        shifted_list = shifted.tolist()
+        row_start = np.arange(num_states) * num_states
+        for block_start in range(1, steps, block_size):
+            random = rng.random((min(block_size, steps - block_start), chains))
+            if chains == 1:
+                # For a single chain, the overhead of an array operation per step is larger than the work,
+                # so the binary search is done on Python floats.
+                state = int(samples[block_start - 1, 0])
+                block = []
+                for u in random[:, 0].tolist():
+                    state = min(bisect.bisect_right(shifted_list, state + u) - state * num_states, num_states - 1)
+                    block.append(state)
+                samples[block_start:block_start + len(random), 0] = block
+                continue
+            for i, step in enumerate(range(block_start, block_start + len(random))):
+                state = samples[step - 1]
+                position = np.searchsorted(shifted, state + random[i], side="right")
+                samples[step] = np.minimum(position - row_start[state], num_states - 1)
+        return samples.T
+
+    def names(self, samples):
+        """Return the state names of an array of state indices as (nested) lists."""
+        return np.array(self.states, dtype=object)[samples].tolist()
+
+    def distribution(self, n, start=None):
+        """Return the distribution of the states after n steps."""
+        start = self.start if start is None else np.asarray(start, dtype=np.float64)
+        return start @ np.linalg.matrix_power(self.transitions, n)
+
+    def stationary(self):
+        """Return the stationary distribution of the chain."""
+        eigenvalues, eigenvectors = np.linalg.eig(self.transitions.T)
+        vector = np.real(eigenvectors[:, np.argmin(np.abs(eigenvalues - 1))])
+        return vector / vector.sum()
@@ -0,0 +1,26 @@
+from chain import MarkovChain, transitionMatrix
+
+# The same Markov chain as in model.py, built with the in-repo chain engine instead of pomegranate.
+
+# Define starting probabilities
+start = {
+    "sun": 0.5,
+    "rain": 0.5
+}
+
+# Define transition model (rows of the ConditionalProbabilityTable in model.py)
+transitions, states = transitionMatrix([
+    ["sun", "sun", 0.8],
+    ["sun", "rain", 0.2],
+    ["rain", "sun", 0.3],
+    ["rain", "rain", 0.7]
+])
+
+model = MarkovChain(transitions, start, states)
+
+# Sample 50 states from chain
+print(model.names(model.sample(50))[0])
+
+# Distribution of the states after 50 steps, and the stationary distribution
+print(dict(zip(states, model.distribution(50).tolist())))
+print(dict(zip(states, model.stationary().tolist())))
@@ -0,0 +1,183 @@
+import os
+import tempfile
+from collections import deque
+
+import numpy as np
+
+# Streaming Hidden Markov Model Engine:
+# model.predict needs the whole observation sequence in memory. Here the observations are processed one step
+# at a time, so that an unbounded stream (e.g. a sensor feed) can be handled with constant memory per step.
+# Every step processes a batch of independent streams at once (one observation per stream).
+# Filtering: P(X_t | e_1..t) is computed from P(X_t-1 | e_1..t-1) and the new observation (forward algorithm):
+#   P(X_t | e_1..t) = α * P(e_t | X_t) * sum_over_x( P(X_t | x) * P(x | e_1..t-1) )
+# Fixed-lag smoothing: P(X_t-lag | e_1..t) also uses the `lag` observations after t-lag.
+# The filtered distributions of the last `lag` steps are kept and combined with a backward pass over them.
+# Viterbi: the most likely sequence of hidden states. For every step and state, the probability of the most likely
+# path ending in that state is kept (in log space, so that long sequences don't underflow),
+# together with a backpointer to the previous state of that path. The backpointers are needed for the whole
+# sequence; they are written to disk in chunks of chunk_size steps.
+
+
+class HiddenMarkovModel():
+    def __init__(self, transitions, emissions, starts, state_names, observation_names):
+        # transitions[i, j]: P(X_t = j | X_t-1 = i)
+        # emissions[i, k]: P(e_t = k | X_t = i)
+        self.transitions = np.asarray(transitions, dtype=np.float64)
+        self.emissions = np.asarray(emissions, dtype=np.float64)
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.state_names = list(state_names)
+        self.observation_names = list(observation_names)
+        self.observation_index = {name: k for k, name in enumerate(self.observation_names)}
+        with np.errstate(divide="ignore"):
+            self.log_transitions = np.log(self.transitions)
+            self.log_emissions = np.log(self.emissions)
+            self.log_starts = np.log(self.starts)
+
+    @classmethod
+    def fromDistributions(cls, transitions, distributions, starts, state_names):
+        """
+        Build the model from one emission distribution {observation: probability} per state
+        (the parameters of the pomegranate DiscreteDistributions in model.py).
+        """
+        observation_names = list(dict.fromkeys(name for distribution in distributions for name in distribution))
+        emissions = [[distribution.get(name, 0) for name in observation_names] for distribution in distributions]
+        return cls(transitions, emissions, starts, state_names, observation_names)
+
+    def encode(self, observations):
+        """Return the observation indices of a list (or nested lists) of observation names."""
+        if isinstance(observations, str):
+            return self.observation_index[observations]
+        return np.array([self.encode(observation) for observation in observations], dtype=np.int64)
+
+
+class ForwardFilter():
+    """
+    Online filtering of batch_size independent observation streams.
+    """
+
+    def __init__(self, model, batch_size=1):
+        self.model = model
+        self.belief = None
+        self.log_likelihood = np.zeros(batch_size)
+
+    def update(self, observations):
+        """
+        Process one observation index per stream.
+        Return P(X_t | e_1..t) as an array of shape (batch size, number of states).
+        """
+        if self.belief is None:
+            prediction = np.broadcast_to(self.model.starts, (len(self.log_likelihood), len(self.model.starts)))
+        else:
+            prediction = self.belief @ self.model.transitions
+        belief = prediction * self.model.emissions[:, observations].T
+        norm = belief.sum(axis=1, keepdims=True)
+        # The normalization constants are the probabilities of the observations given all previous observations.
+        self.log_likelihood += np.log(norm[:, 0])
+        self.belief = belief / norm
+        return self.belief
+
+
+class FixedLagSmoother():
+    """
+    Online fixed-lag smoothing of batch_size independent observation streams.
+    """
+
+    def __init__(self, model, lag, batch_size=1):
+        self.model = model
+        self.filter = ForwardFilter(model, batch_size)
+        # Filtered distributions and observations of the steps t-lag..t
+        self.window = deque(maxlen=lag + 1)
+
+    def smooth(self, position):
+        """Return the smoothed distribution of a step in the window, given all observations in the window."""
+        entries = list(self.window)
+        backward = np.ones_like(entries[position][0])
+        for _, observations in reversed(entries[position + 1:]):
+            backward = (self.model.emissions[:, observations].T * backward) @ self.model.transitions.T
+            backward /= backward.sum(axis=1, keepdims=True)
+        smoothed = entries[position][0] * backward
+        return smoothed / smoothed.sum(axis=1, keepdims=True)
+
+    def update(self, observations):
+        """
+        Process one observation index per stream.
+        Return P(X_t-lag | e_1..t) (shape (batch size, number of states)), or None for the first `lag` steps.
+        """
+        self.window.append((self.filter.update(observations), observations))
+        if len(self.window) < self.window.maxlen:
+            return None
+        return self.smooth(0)
+
+    def flush(self):
+        """
+        Return the smoothed distributions of the last steps that were not returned by update yet
+        (at the end of the stream they can only use the remaining observations).
+        """
+        start = 1 if len(self.window) == self.window.maxlen else 0
+        return [self.smooth(position) for position in range(start, len(self.window))]
+
+
+class ViterbiDecoder():
+    """
+    Online Viterbi decoding of batch_size independent observation streams.
+    Backpointers are spilled to files in spill_directory (a temporary directory by default)
+    every chunk_size steps.
+    """
+
+    def __init__(self, model, batch_size=1, chunk_size=100000, spill_directory=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.log_probabilities = None
+        self.backpointers = []
+        self.spilled = []
+        self.temporary_directory = None
+        if spill_directory is None:
+            self.temporary_directory = tempfile.TemporaryDirectory()
+            spill_directory = self.temporary_directory.name
+        self.spill_directory = spill_directory
+
+    def update(self, observations):
+        """Process one observation index per stream."""
+        log_emissions = self.model.log_emissions[:, observations].T
+        if self.log_probabilities is None:
+            self.log_probabilities = self.model.log_starts + log_emissions
+            return
+        # candidates[b, i, j]: log probability of the best path of stream b ending in state i, followed by state j
+        candidates = self.log_probabilities[:, :, np.newaxis] + self.model.log_transitions
+        best = candidates.argmax(axis=1)
+        self.log_probabilities = np.take_along_axis(candidates, best[:, np.newaxis, :], axis=1)[:, 0] + log_emissions
+        self.backpointers.append(best.astype(np.int32))
+        if len(self.backpointers) == self.chunk_size:
+            self.spill()
+
+    def spill(self):
+        """Write the backpointers in memory to a file."""
+        path = os.path.join(self.spill_directory, f"backpointers{len(self.spilled)}.npy")
+        np.save(path, np.stack(self.backpointers))
+        self.spilled.append(path)
+        self.backpointers = []
+
+    def decode(self):
+        """
+        Return the most likely state sequence of every stream (array of shape (batch size, steps))
+        and its log probability.
+        Before the first update, the sequences are empty (with log probability 0).
+        """
+        if self.log_probabilities is None:
+            return np.empty((self.batch_size, 0), dtype=np.int64), np.zeros(self.batch_size)
+        state = self.log_probabilities.argmax(axis=1)
+        log_probability = self.log_probabilities[np.arange(self.batch_size), state]
+        chunks = [np.stack(self.backpointers)] if self.backpointers else []
+        num_steps = 1 + sum(len(chunk) for chunk in chunks) + self.chunk_size * len(self.spilled)
+        path = np.empty((self.batch_size, num_steps), dtype=np.int64)
+        step = num_steps - 1
+        path[:, step] = state
+
+        # Follow the backpointers from the last step to the first, loading the spilled chunks in reverse.
+        for chunk in chunks + [np.load(spilled, mmap_mode="r") for spilled in reversed(self.spilled)]:
+            for backpointers in chunk[::-1]:
+                state = backpointers[np.arange(self.batch_size), state]
+                step -= 1
+                path[:, step] = state
+        return path, log_probability
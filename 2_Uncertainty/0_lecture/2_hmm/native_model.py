@@ -0,0 +1,25 @@
+from hmm import HiddenMarkovModel
+
+# The same model as in model.py, built with the in-repo streaming HMM engine instead of pomegranate.
+
+# Observation model for each state
+sun = {
+    "umbrella": 0.2,
+    "no umbrella": 0.8
+}
+
+rain = {
+    "umbrella": 0.9,
+    "no umbrella": 0.1
+}
+
+# Transition model
+transitions = [
+    [0.8, 0.2],  # Tomorrow's predictions if today = sun
+    [0.3, 0.7]   # Tomorrow's predictions if today = rain
+]
+
+# Starting probabilities
+starts = [0.5, 0.5]
+
+model = HiddenMarkovModel.fromDistributions(transitions, [sun, rain], starts, state_names=["sun", "rain"])
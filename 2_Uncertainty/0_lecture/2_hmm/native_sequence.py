@@ -0,0 +1,27 @@
+from hmm import ViterbiDecoder
+from native_model import model
+
+# Same observations as in sequence.py, fed to the decoder one at a time like a stream.
+# The result is not the same: model.predict in sequence.py uses pomegranate's default "map" algorithm,
+# which chooses the most likely state of every step on its own (rain, rain, sun, rain x4, sun, sun).
+# The Viterbi decoder returns the most likely sequence of states as a whole (rain x7, sun, sun).
+observations = [
+    "umbrella",
+    "umbrella",
+    "no umbrella",
+    "umbrella",
+    "umbrella",
+    "umbrella",
+    "umbrella",
+    "no umbrella",
+    "no umbrella"
+]
+
+decoder = ViterbiDecoder(model)
+for observation in observations:
+    decoder.update(model.encode([observation]))
+
+# Predict underlying states (most likely sequence of states given the observations)
+paths, _ = decoder.decode()
+for prediction in paths[0]:
+    print(model.state_names[prediction])
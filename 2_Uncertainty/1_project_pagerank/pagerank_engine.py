@@ -0,0 +1,675 @@
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from pagerank import DAMPING
+
+# Sparse Matrix PageRank Engine:
+# iteratePagerank looks up all pages that link to a page in every iteration, which is O(N²) per sweep.
+# Here the link structure is built once as a sparse column-stochastic matrix M with
+# M[i, j] = 1 / NumLinks(j) if page j links to page i.
+# Then one iteration of the Random Surfer Model formula for all pages at once is a sparse matrix-vector product:
+#   PR = d * (M · PR + dangling_mass / N) + (1 - d) / N
+# dangling_mass is the sum of the PageRanks of all pages without links.
+# As in transitionModel, a page without links is interpreted as having one link to every page in the corpus.
+# Distributing its PageRank uniformly avoids storing N entries per dangling page in the matrix.
+
+
+def editLinks(links, keep, num_pages, removed, added):
+    """
+    Apply a delta to the structure of a square sparse matrix links (CSR format with sorted indices).
+    The rows and columns of the pages i where keep[i] is False are removed, and the matrix is extended to
+    num_pages rows and columns. removed and added are tuples (rows, columns) of entries in the new page IDs.
+    Return the arrays (indptr, indices) of the new matrix.
+    """
+    indptr, indices = links.indptr.astype(np.int64), links.indices
+    if not keep.all():
+        kept = keep[indices]
+        # Entries in the columns of removed pages are counted per row, then the rows of removed pages are dropped.
+        row_lengths = np.diff(indptr) - np.bincount(
+            np.searchsorted(indptr, np.flatnonzero(~kept), side="right") - 1, minlength=len(keep)
+        )
+        for row in np.flatnonzero(~keep):
+            kept[indptr[row]:indptr[row + 1]] = False
+        indices = (np.cumsum(keep, dtype=indices.dtype) - 1)[indices[kept]]
+        indptr = np.concatenate([[0], np.cumsum(row_lengths[keep])])
+    indptr = np.concatenate([indptr, np.full(num_pages + 1 - len(indptr), indptr[-1])])
+
+    def find(rows, columns):
+        # Binary search for the columns in their rows, for all entries at once.
+        low, high = indptr[rows], indptr[rows + 1]
+        while True:
+            searching = low < high
+            if not searching.any():
+                break
+            middle = (low + high) // 2
+            right = searching & (indices[np.minimum(middle, len(indices) - 1)] < columns)
+            low = np.where(right, middle + 1, low)
+            high = np.where(searching & ~right, middle, high)
+        found = low < indptr[rows + 1]
+        found[found] = indices[low[found]] == columns[found]
+        return low, found
+
+    def shift(rows, sign):
+        indptr[1:] += sign * np.cumsum(np.bincount(rows, minlength=num_pages))
+
+    positions, found = find(*removed)
+    indices = np.delete(indices, positions[found])
+    shift(removed[0][found], -1)
+    # Entries inserted at the same position have to be in the order of their columns.
+    order = np.lexsort((added[1], added[0]))
+    rows, columns = added[0][order], added[1][order]
+    positions, found = find(rows, columns)
+    indices = np.insert(indices, positions[~found], columns[~found])
+    shift(rows[~found], 1)
+    return indptr, indices
+
+
+class LinkGraph():
+    """
+    Link structure of a corpus.
+    Page names are interned to integer IDs (the index in self.pages).
+    """
+
+    def __init__(self, pages, sources, targets):
+        # sources[k] links to targets[k] (arrays of page IDs, every link at most once)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        num_pages = len(pages)
+        links = scipy.sparse.csr_matrix(
+            (np.ones(len(sources)), (targets, sources)), shape=(num_pages, num_pages)
+        )
+        self.setLinks(pages, links)
+
+    @classmethod
+    def fromLinks(cls, pages, links, page_ids=None, out_degree=None):
+        """
+        Builds the link graph from a sparse matrix links, where links[i, j] != 0 if page j links to page i.
+        The matrix is not copied, its values are replaced by the link probabilities.
+        """
+        graph = cls.__new__(cls)
+        graph.setLinks(pages, links, page_ids, out_degree)
+        return graph
+
+    def setLinks(self, pages, links, page_ids=None, out_degree=None):
+        """Sets the pages and computes the link probabilities (see fromLinks)."""
+        self.pages = list(pages)
+        self.page_ids = {page: i for i, page in enumerate(self.pages)} if page_ids is None else page_ids
+        self.num_pages = len(self.pages)
+
+        # Column j of the matrix contains the probability to follow a link from page j to every other page.
+        self.matrix = links.tocsr()
+        self.matrix.sort_indices()
+        if out_degree is None:
+            out_degree = np.bincount(self.matrix.indices, minlength=self.num_pages)
+        self.out_degree = out_degree
+        self.dangling = self.out_degree == 0
+        self.matrix.data = (1 / np.maximum(self.out_degree, 1))[self.matrix.indices]
+        # Links in the other direction (row j contains the pages that page j links to), see outLinks.
+        self.out_links = None
+
+    def outLinks(self):
+        """
+        Returns a sparse matrix where row j contains the pages that page j links to.
+        It is computed on the first call and kept up to date by update.
+        """
+        if self.out_links is None:
+            self.out_links = self.matrix.T.tocsr()
+        return self.out_links
+
+    @classmethod
+    def fromCorpus(cls, corpus):
+        """Builds the link graph from a corpus dictionary as returned by crawl."""
+        pages = list(corpus)
+        page_ids = {page: i for i, page in enumerate(pages)}
+        sources = []
+        targets = []
+        for page in pages:
+            for link in corpus[page]:
+                sources.append(page_ids[page])
+                targets.append(page_ids[link])
+        return cls(pages, sources, targets)
+
+    @classmethod
+    def load(cls, prefix):
+        """
+        Builds the link graph from the files written by crawlParallel.
+        The edge list is memory-mapped instead of read into memory.
+        """
+        with open(prefix + ".pages", encoding="utf-8") as f:
+            pages = f.read().splitlines()
+        # np.memmap can't map an empty file
+        if os.path.getsize(prefix + ".edges"):
+            edges = np.memmap(prefix + ".edges", dtype=np.int32, mode="r").reshape(-1, 2)
+        else:
+            edges = np.zeros((0, 2), dtype=np.int32)
+        return cls(pages, edges[:, 0], edges[:, 1])
+
+    def idMap(self, removed_pages=()):
+        """
+        Return an array that maps every page ID to the page ID after removing pages (-1 for removed pages).
+        """
+        keep = np.ones(self.num_pages, dtype=bool)
+        keep[[self.page_ids[page] for page in set(removed_pages) if page in self.page_ids]] = False
+        return np.where(keep, np.cumsum(keep) - 1, -1)
+
+    def update(self, added_pages=(), removed_pages=(), added_links=(), removed_links=()):
+        """
+        Return a new link graph with a delta applied.
+        Links are (source page, target page) pairs. Removing a page also removes all of its links.
+        Page IDs of the remaining pages keep their order, added pages are appended.
+        """
+        id_map = self.idMap(removed_pages)
+        keep = id_map >= 0
+        pages = list(self.pages)
+        page_ids = self.page_ids.copy()
+        if not keep.all():
+            # Only the pages after the first removed page get a new page ID.
+            first = int(np.argmin(keep))
+            for page in set(removed_pages):
+                page_ids.pop(page, None)
+            pages = pages[:first] + list(itertools.compress(pages[first:], keep[first:].tolist()))
+            page_ids.update(zip(pages[first:], range(first, len(pages))))
+        for page in dict.fromkeys(added_pages):
+            if page not in self.page_ids:
+                page_ids[page] = len(pages)
+                pages.append(page)
+        num_pages = len(pages)
+
+        def encode(links):
+            # Returns the arrays (sources, targets) of the distinct links.
+            keys = np.unique(np.array(
+                [page_ids[source] * num_pages + page_ids[target] for source, target in links
+                 if source in page_ids and target in page_ids and source != target],
+                dtype=np.int64
+            ))
+            return keys // num_pages, keys % num_pages
+
+        # The delta is applied to the arrays of the existing matrix (see editLinks)
+        # instead of building the matrix from all links again.
+        removed_sources, removed_targets = encode(removed_links)
+        added_sources, added_targets = encode(added_links)
+        shape = (num_pages, num_pages)
+        out_links, out_degree = None, None
+        if self.out_links is not None:
+            # The number of links of every page is the row length of out_links.
+            indptr, indices = editLinks(
+                self.out_links, keep, num_pages, (removed_sources, removed_targets), (added_sources, added_targets)
+            )
+            out_links = scipy.sparse.csr_matrix((np.ones(len(indices), dtype=bool), indices, indptr), shape)
+            out_degree = np.diff(indptr)
+        indptr, indices = editLinks(
+            self.matrix, keep, num_pages, (removed_targets, removed_sources), (added_targets, added_sources)
+        )
+        graph = LinkGraph.fromLinks(
+            pages, scipy.sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape), page_ids, out_degree
+        )
+        graph.out_links = out_links
+        return graph
+
+    def step(self, page_ranks, damping_factor, teleport=None):
+        """
+        Applies the Random Surfer Model formula once to all PageRank values.
+        page_ranks can also be a matrix with one PageRank vector per column.
+        teleport is the probability distribution of the page chosen with probability 1 - d
+        (uniform by default, one column per PageRank vector otherwise).
+        """
+        dangling_mass = page_ranks[self.dangling].sum(axis=0)
+        if teleport is None:
+            teleport = 1 / self.num_pages
+        return (damping_factor * (self.matrix @ page_ranks + dangling_mass / self.num_pages)
+                + (1 - damping_factor) * teleport)
+
+    def toDict(self, page_ranks):
+        """Converts a PageRank vector to a dictionary where keys are page names."""
+        return {page: float(page_ranks[i]) for i, page in enumerate(self.pages)}
+
+
+def powerIteration(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000, page_ranks=None,
+                   residuals=None):
+    """
+    Return the PageRank vector of the link graph by power iteration,
+    starting from page_ranks (uniform by default).
+    The iteration stops when the L1 norm of the change of all PageRank values
+    is not larger than tolerance, or after max_iterations.
+    If residuals is a list, the L1 norm of the change of every iteration is appended to it.
+    Return a tuple (PageRank vector, number of iterations).
+    """
+    if page_ranks is None:
+        page_ranks = np.full(graph.num_pages, 1 / graph.num_pages)
+    for iteration in range(1, max_iterations + 1):
+        page_ranks_next = graph.step(page_ranks, damping_factor)
+        residual = np.abs(page_ranks_next - page_ranks).sum()
+        page_ranks = page_ranks_next
+        if residuals is not None:
+            residuals.append(float(residual))
+        if residual <= tolerance:
+            break
+    return page_ranks / page_ranks.sum(), iteration
+
+
+# Convergence Accelerators:
+# All solvers take (graph, damping_factor, tolerance, max_iterations) and return a tuple
+# (PageRank vector, list of the L1 residuals of every iteration), so that their convergence can be compared.
+def powerSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    """Plain power iteration (Jacobi sweeps)."""
+    residuals = []
+    page_ranks, _ = powerIteration(graph, damping_factor, tolerance, max_iterations, residuals=residuals)
+    return page_ranks, residuals
+
+
+# Gauss-Seidel:
+# Every page is updated with the PageRank values of the pages before it that were already updated in this sweep.
+# With M = L + U (L: links from a page to itself or to pages with a lower ID; U: links to pages with a higher ID)
+# one sweep solves the triangular system (I - d * L) · PR_next = d * U · PR + (d * dangling_mass + 1 - d) / N.
+# The dangling mass is taken from the previous sweep.
+def gaussSeidelSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    """Gauss-Seidel sweeps."""
+    lower = scipy.sparse.csr_matrix(
+        scipy.sparse.identity(graph.num_pages) - damping_factor * scipy.sparse.tril(graph.matrix)
+    )
+    upper = scipy.sparse.triu(graph.matrix, k=1).tocsr()
+    page_ranks = np.full(graph.num_pages, 1 / graph.num_pages)
+    residuals = []
+    for _ in range(max_iterations):
+        dangling_mass = page_ranks[graph.dangling].sum()
+        right_side = (damping_factor * (upper @ page_ranks)
+                      + (damping_factor * dangling_mass + 1 - damping_factor) / graph.num_pages)
+        page_ranks_next = scipy.sparse.linalg.spsolve_triangular(lower, right_side, lower=True)
+        # A sweep does not preserve the sum of the PageRank values like power iteration does.
+        # Normalizing removes the slowly decaying error along the PageRank vector itself.
+        page_ranks_next /= page_ranks_next.sum()
+        residuals.append(float(np.abs(page_ranks_next - page_ranks).sum()))
+        page_ranks = page_ranks_next
+        if residuals[-1] <= tolerance:
+            break
+    return page_ranks / page_ranks.sum(), residuals
+
+
+def extrapolate(history, quadratic):
+    """
+    Return an estimate of the limit of the last iterates in history.
+    Aitken extrapolation uses the last 3 iterates per page, quadratic extrapolation the last 4 for all pages.
+    """
+    if quadratic:
+        # Approximate the power iteration by a polynomial of degree 2 (Kamvar et al., 2003).
+        x0, x1, x2, x3 = history
+        y = np.column_stack([x1 - x0, x2 - x0])
+        gamma1, gamma2 = np.linalg.lstsq(y, -(x3 - x0), rcond=None)[0]
+        beta0 = gamma1 + gamma2 + 1
+        beta1 = gamma2 + 1
+        estimate = beta0 * x1 + beta1 * x2 + x3
+    else:
+        x0, x1, x2 = history[-3:]
+        second_difference = x2 - 2 * x1 + x0
+        estimate = x2.copy()
+        valid = np.abs(second_difference) > 1e-15
+        estimate[valid] = x0[valid] - (x1[valid] - x0[valid]) ** 2 / second_difference[valid]
+    # The extrapolation may produce negative values for pages that have not converged yet.
+    estimate = np.maximum(estimate, 0)
+    return estimate / estimate.sum()
+
+
+def extrapolationSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000,
+                        quadratic=False, interval=10):
+    """Power iteration with Aitken or quadratic extrapolation every `interval` iterations."""
+    page_ranks = np.full(graph.num_pages, 1 / graph.num_pages)
+    history = [page_ranks]
+    residuals = []
+    for iteration in range(1, max_iterations + 1):
+        page_ranks_next = graph.step(page_ranks, damping_factor)
+        residuals.append(float(np.abs(page_ranks_next - page_ranks).sum()))
+        page_ranks = page_ranks_next
+        if residuals[-1] <= tolerance:
+            break
+        history = history[-3:] + [page_ranks]
+        if iteration % interval == 0 and len(history) == 4:
+            page_ranks = extrapolate(history, quadratic)
+            history = [page_ranks]
+    return page_ranks / page_ranks.sum(), residuals
+
+
+def aitkenSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    return extrapolationSolver(graph, damping_factor, tolerance, max_iterations, quadratic=False)
+
+
+def quadraticSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    return extrapolationSolver(graph, damping_factor, tolerance, max_iterations, quadratic=True)
+
+
+# Adaptive PageRank (Kamvar et al., 2003):
+# Most pages converge long before the pages with a high PageRank.
+# A page is frozen when its value changed by at most (1 - d) * tolerance times its own value in an iteration.
+# The error of a page is about its change / (1 - d), so the L1 error of all frozen pages is at most tolerance.
+# Only the rows of the pages that are not frozen are recomputed.
+# The residual of an iteration is the change of the active pages plus the last change of every frozen page,
+# so freezing pages does not make the residual look smaller than it is.
+# Frozen pages may still change a little, so when the residual is not larger than tolerance, all pages are
+# recomputed once. Convergence is only accepted if the change of this full sweep is not larger than tolerance.
+# Otherwise only the pages that no longer satisfy the freezing criterion are unfrozen.
+# All pages are also recomputed every `interval` iterations, so that a page that was frozen too early is unfrozen.
+def adaptiveSolver(graph, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000, interval=10):
+    """Power iteration that only updates pages that have not converged yet."""
+    page_ranks = np.full(graph.num_pages, 1 / graph.num_pages)
+    change = np.zeros(graph.num_pages)
+    active = np.arange(graph.num_pages)
+    rows = graph.matrix
+    residuals = []
+    for iteration in range(1, max_iterations + 1):
+        full_sweep = len(active) == graph.num_pages
+        # The PageRank values of frozen pages are not rescaled with the others, so their sum drifts away from 1.
+        # The mass of the surfers that jump to a random page is computed as 1 - d * (mass that follows a link)
+        # instead, which equals d * dangling_mass + 1 - d if the sum is 1, and doesn't let the drift accumulate.
+        jump_mass = 1 - damping_factor * page_ranks[~graph.dangling].sum()
+        update = damping_factor * (rows @ page_ranks) + jump_mass / graph.num_pages
+        change[active] = np.abs(update - page_ranks[active])
+        page_ranks[active] = update
+        residuals.append(float(change.sum()))
+        if residuals[-1] <= tolerance:
+            if full_sweep:
+                break
+            active = np.arange(graph.num_pages)
+            rows = graph.matrix
+            continue
+        # Selecting the rows of the active pages takes about as long as an iteration,
+        # so they are only selected again if at least 10% of them were frozen.
+        frozen = change <= (1 - damping_factor) * tolerance * page_ranks
+        num_active = np.count_nonzero(~frozen)
+        if full_sweep or num_active < 0.9 * len(active):
+            active = np.flatnonzero(~frozen)
+            rows = graph.matrix[active]
+        if not num_active or iteration % interval == 0:
+            active = np.arange(graph.num_pages)
+            rows = graph.matrix
+    return page_ranks / page_ranks.sum(), residuals
+
+
+SOLVERS = {
+    "power": powerSolver,
+    "gauss-seidel": gaussSeidelSolver,
+    "aitken": aitkenSolver,
+    "quadratic": quadraticSolver,
+    "adaptive": adaptiveSolver,
+}
+
+
+def solvePagerank(graph, solver="power", damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    """
+    Return the PageRank vector of the link graph computed by one of the SOLVERS
+    and the L1 residual of every iteration.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"unknown solver {solver}, choose one of {', '.join(SOLVERS)}")
+    return SOLVERS[solver](graph, damping_factor, tolerance, max_iterations)
+
+
+# Incremental Update:
+# If the link graph changes only slightly, the previous PageRank vector is already close to the new one.
+# PageRank is the solution of the linear system PR = step(PR). The residual r = step(PR) - PR is only large
+# for pages near the changed links (and uniformly small for all pages if the number of pages changed).
+# Local push (vectorized Gauss-Southwell): only the pages with a large residual are updated. Updating page i
+# by r[i] changes the residual of the pages it links to by d * r[i] / NumLinks(i)
+# (or of all pages by d * r[i] / N if page i has no links). The remaining pages are not touched.
+# The error of the result is at most sum(|r|) / (1 - d), so pushing stops when sum(|r|) <= tolerance * (1 - d),
+# which is at the latest the case when no page has a residual above tolerance * (1 - d) / N.
+# The pages above this threshold form the frontier. In every round, the whole frontier is pushed along its
+# out-links (the rows of graph.outLinks()), and only the pages that received a push can join the next frontier,
+# so a round takes time proportional to the number of links of the frontier instead of the number of pages.
+# The pushes of pages without links are collected in a residual shared by all pages. Only when it could have
+# moved pages above the threshold, it is added to all pages and the frontier is searched in all pages again.
+# If the frontier has more than 1/10 of all links (e.g. if the number of pages changed, which changes the residual
+# of all pages), pushing all pages with one sparse matrix-vector product is faster. This is a power iteration step.
+def localPush(graph, page_ranks, damping_factor=DAMPING, tolerance=1e-8, max_rounds=1000):
+    """
+    Return the PageRank vector of the link graph, starting from an approximation page_ranks
+    and updating only pages with a large residual.
+    The result is within tolerance (L1 norm) of the exact PageRank vector.
+    Return a tuple (PageRank vector, number of push rounds).
+    """
+    page_ranks = np.array(page_ranks, dtype=np.float64)
+    out_links = graph.outLinks()
+    link_probability = damping_factor / np.maximum(graph.out_degree, 1)
+    residual = graph.step(page_ranks, damping_factor) - page_ranks
+    max_residual = tolerance * (1 - damping_factor)
+    threshold = max_residual / graph.num_pages
+    # Residual of all pages that is not included in residual yet
+    shared = 0.0
+    # sum(|residual|) is updated with the changes of every round, so that it doesn't have to be summed over all pages.
+    # The sum of the actual residuals is at most total + N * |shared|.
+    total = np.abs(residual).sum()
+    frontier = np.flatnonzero(np.abs(residual) > threshold)
+
+    for push_round in range(1, max_rounds + 1):
+        if not len(frontier) or total + graph.num_pages * abs(shared) <= max_residual or abs(shared) > threshold / 2:
+            residual += shared
+            shared = 0.0
+            total = np.abs(residual).sum()
+            if total <= max_residual:
+                break
+            frontier = np.flatnonzero(np.abs(residual) > threshold)
+        if graph.out_degree[frontier].sum() > graph.matrix.nnz / 10:
+            page_ranks += residual + shared
+            shared = 0.0
+            residual = graph.step(page_ranks, damping_factor) - page_ranks
+            total = np.abs(residual).sum()
+            frontier = np.flatnonzero(np.abs(residual) > threshold)
+            continue
+        push = residual[frontier] + shared
+        page_ranks[frontier] += push
+        total += len(frontier) * abs(shared) - np.abs(residual[frontier]).sum()
+        residual[frontier] = -shared
+
+        # Gather the out-links of all frontier pages from the rows of out_links.
+        starts = out_links.indptr[frontier]
+        counts = out_links.indptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        targets, inverse = np.unique(out_links.indices[offsets], return_inverse=True)
+        total -= np.abs(residual[targets]).sum()
+        residual[targets] += np.bincount(
+            inverse, weights=np.repeat(push * link_probability[frontier], counts), minlength=len(targets)
+        )
+        total += np.abs(residual[targets]).sum()
+        shared += damping_factor * push[graph.dangling[frontier]].sum() / graph.num_pages
+        frontier = targets[np.abs(residual[targets] + shared) > threshold]
+    return page_ranks, push_round
+
+
+def incrementalPagerank(graph, page_ranks, damping_factor=DAMPING, tolerance=1e-8, max_rounds=1000,
+                        added_pages=(), removed_pages=(), added_links=(), removed_links=()):
+    """
+    Apply a delta to the link graph and update its PageRank vector by local push,
+    warm-starting from the previous PageRank vector.
+    Return a tuple (new link graph, new PageRank vector, number of push rounds).
+    """
+    new_graph = graph.update(added_pages, removed_pages, added_links, removed_links)
+
+    # Pages keep their PageRank values, new pages start with 1 / N.
+    id_map = graph.idMap(removed_pages)
+    kept = id_map >= 0
+    warm_start = np.full(new_graph.num_pages, 1 / new_graph.num_pages)
+    warm_start[id_map[kept]] = page_ranks[kept]
+    warm_start /= warm_start.sum()
+    new_page_ranks, push_rounds = localPush(new_graph, warm_start, damping_factor, tolerance, max_rounds)
+    return new_graph, new_page_ranks, push_rounds
+
+
+# Personalized PageRank:
+# Instead of choosing one out of all pages with probability 1 - d, the surfer jumps to one of the pages of a seed set.
+# The PageRank vectors of many seed sets are computed at once by iterating a matrix X with one column per seed set
+# (sparse matrix - dense matrix product). The seed sets are processed in batches, so that X only has batch_size
+# columns, and only the top k pages of every column are kept.
+def personalizedPagerank(graph, seed_sets, top_k=10, damping_factor=DAMPING, tolerance=1e-8,
+                         max_iterations=1000, batch_size=64):
+    """
+    Return the top_k pages with the highest personalized PageRank for every seed set (an iterable of page names).
+    Return a list with one list of (page, PageRank value) tuples per seed set, sorted by PageRank value.
+    Raise ValueError if a seed set is empty or contains a page that is not in the graph.
+    """
+    top_k = min(top_k, graph.num_pages)
+    seed_sets = [set(seeds) for seeds in seed_sets]
+    for k, seeds in enumerate(seed_sets):
+        if not seeds:
+            raise ValueError(f"seed set {k} is empty")
+        unknown = seeds - graph.page_ids.keys()
+        if unknown:
+            raise ValueError(f"seed set {k} contains unknown pages: {', '.join(sorted(map(str, unknown)))}")
+    seed_sets = [[graph.page_ids[page] for page in seeds] for seeds in seed_sets]
+    results = []
+    for start in range(0, len(seed_sets), batch_size):
+        batch = seed_sets[start:start + batch_size]
+
+        # Column k of teleport is the uniform distribution over seed set k.
+        teleport = np.zeros((graph.num_pages, len(batch)))
+        for k, seeds in enumerate(batch):
+            teleport[seeds, k] = 1 / len(seeds)
+
+        page_ranks = teleport.copy()
+        for _ in range(max_iterations):
+            page_ranks_next = graph.step(page_ranks, damping_factor, teleport)
+            # converged if the L1 change of every PageRank vector is not larger than tolerance
+            residual = np.abs(page_ranks_next - page_ranks).sum(axis=0).max()
+            page_ranks = page_ranks_next
+            if residual <= tolerance:
+                break
+
+        # Select the top k rows of every column without sorting all pages.
+        top = np.argpartition(-page_ranks, top_k - 1, axis=0)[:top_k]
+        for k in range(len(batch)):
+            ranks = page_ranks[top[:, k], k]
+            order = np.argsort(-ranks, kind="stable")
+            results.append([(graph.pages[top[i, k]], float(ranks[i])) for i in order])
+    return results
+
+
+def sparsePagerank(corpus, damping_factor=DAMPING, tolerance=1e-8, max_iterations=1000):
+    """
+    Return PageRank values for each page of the corpus using the sparse matrix engine.
+    Return a dictionary in the same format as iteratePagerank.
+    """
+    graph = LinkGraph.fromCorpus(corpus)
+    page_ranks, _ = powerIteration(graph, damping_factor, tolerance, max_iterations)
+    return graph.toDict(page_ranks)
+
+
+# Vectorized Sampling:
+# samplePagerank builds the whole transition model (O(N)) for every single sample.
+# Here many independent random surfers are simulated in parallel with NumPy.
+# The out-links of each page are stored in CSR format (all links of page j are
+# out_links[links_start[j]:links_start[j + 1]]), so the next page of every surfer is chosen in O(1):
+# with probability d a random link of the current page is followed, otherwise (or if the page has no links)
+# a random page of the whole corpus is chosen.
+def randomSurfers(graph, damping_factor=DAMPING, n=10000, surfers=1000, seed=None):
+    """
+    Return PageRank values estimated from (at least) n samples, drawn by `surfers` random surfers
+    that each start at a random page. seed initializes a numpy.random.Generator.
+    Return a tuple (PageRank vector, number of samples).
+    """
+    rng = np.random.default_rng(seed)
+    out_links = graph.matrix.T.tocsr()
+    links_start = out_links.indptr
+    # one placeholder link, so that the lookup below also works for a corpus without any links
+    links = out_links.indices if out_links.nnz else np.zeros(1, dtype=np.int64)
+    surfers = min(surfers, n)
+    steps = -(-n // surfers)
+
+    visits = np.zeros(graph.num_pages, dtype=np.int64)
+    pages = rng.integers(graph.num_pages, size=surfers)
+    visits += np.bincount(pages, minlength=graph.num_pages)
+    for _ in range(steps - 1):
+        degree = graph.out_degree[pages]
+        follow_link = (rng.random(surfers) < damping_factor) & (degree > 0)
+        # random link offset on the current page (only valid for the surfers that follow a link)
+        offsets = (rng.random(surfers) * degree).astype(np.int64)
+        pages = np.where(
+            follow_link,
+            links[np.minimum(links_start[pages] + offsets, len(links) - 1)],
+            rng.integers(graph.num_pages, size=surfers)
+        )
+        visits += np.bincount(pages, minlength=graph.num_pages)
+
+    num_samples = steps * surfers
+    return visits / num_samples, num_samples
+
+
+def sparseSamplePagerank(corpus, damping_factor=DAMPING, n=10000, surfers=1000, seed=None):
+    """
+    Return PageRank values for each page of the corpus by sampling with parallel random surfers.
+    Return a dictionary in the same format as samplePagerank.
+    """
+    graph = LinkGraph.fromCorpus(corpus)
+    page_ranks, _ = randomSurfers(graph, damping_factor, n, surfers, seed)
+    return graph.toDict(page_ranks)
+
+
+# Parallel Crawler:
+# crawl reads every HTML file serially and keeps the links of all pages as sets of strings.
+# crawlParallel parses the files in a process pool. Every worker memory-maps a file and searches links in it
+# without reading it into a string, and translates the links to integer page IDs right away.
+# The main process appends the links of every chunk of pages as (source, target) int32 pairs to the file
+# <prefix>.edges, that LinkGraph.load can memory-map. <prefix>.pages contains one page name per line
+# (the line number is the page ID).
+LINK_PATTERN = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Page IDs are sent to every worker process only once.
+worker_page_ids = None
+
+
+def initCrawlWorker(page_ids):
+    global worker_page_ids
+    worker_page_ids = page_ids
+
+
+def parsePages(chunk):
+    """
+    Return an array of (source, target) page ID pairs of all links on the pages in chunk.
+    chunk is a list of (page ID, file path).
+    Links from a page to itself and links that don't point to a page in the corpus are ignored.
+    """
+    edges = []
+    for source, path in chunk:
+        with open(path, "rb") as f:
+            # mmap can't map an empty file
+            if not os.fstat(f.fileno()).st_size:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                targets = set()
+                for match in LINK_PATTERN.finditer(contents):
+                    target = worker_page_ids.get(match.group(1).decode("utf-8", "replace"))
+                    if target is not None and target != source:
+                        targets.add(target)
+        edges.extend((source, target) for target in sorted(targets))
+    return np.array(edges, dtype=np.int32).reshape(-1, 2)
+
+
+def crawlParallel(directory, prefix, processes=None, chunk_size=1000):
+    """
+    Parse a directory of HTML pages in a process pool and write the link graph to
+    <prefix>.pages and <prefix>.edges.
+    Return the number of pages and the number of links.
+    """
+    pages = sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.name.endswith(".html") and entry.is_file()
+    )
+    page_ids = {page: i for i, page in enumerate(pages)}
+    with open(prefix + ".pages", "w", encoding="utf-8") as f:
+        for page in pages:
+            f.write(page + "\n")
+
+    chunks = (
+        [(i, os.path.join(directory, pages[i])) for i in range(start, min(start + chunk_size, len(pages)))]
+        for start in range(0, len(pages), chunk_size)
+    )
+    num_links = 0
+    with open(prefix + ".edges", "wb") as f:
+        with multiprocessing.Pool(processes, initializer=initCrawlWorker, initargs=(page_ids,)) as pool:
+            for edges in pool.imap(parsePages, chunks):
+                f.write(edges.tobytes())
+                num_links += len(edges)
+    return len(pages), num_links
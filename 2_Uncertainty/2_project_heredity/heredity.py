@@ -100,22 +100,15 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
+    # Loop over all sets of people who might have the trait.
+    # A known trait is evidence, so only the people with an unknown trait are enumerated
+    # and sets that violate known information are never generated.
+    # All other variables are hidden and need to be enumerated.
     names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information.
-        # If the trait is known then the person must be correctly present ot absent
-        # in the have_trait list, depending on if trait is True of False.
-        # A known trait can be used as evidence.
-        # All other variables are hidden and need to be enumerated.
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    known_trait = {person for person in names if people[person]["trait"]}
+    unknown_trait = {person for person in names if people[person]["trait"] is None}
+    for unknown_have_trait in powerset(unknown_trait):
+        have_trait = known_trait | unknown_have_trait
 
         # Loop over all sets of people who might have the gene
         for one_gene in powerset(names):
@@ -128,8 +121,14 @@ def main():
     # Ensure probabilities sum to 1
     normalize(probabilities)
 
-    # Print results
-    for person in people:
+    printProbabilities(probabilities)
+
+
+def printProbabilities(probabilities):
+    """
+    Print the gene and trait probability distribution of every person.
+    """
+    for person in probabilities:
         print(f"{person}:")
         for field in probabilities[person]:
             print(f"  {field.capitalize()}:")
@@ -163,14 +162,13 @@ def loadData(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Generate all possible subsets of set s (one at a time, instead of building a list of all 2^n subsets).
     """
     s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    for subset in itertools.chain.from_iterable(
+        itertools.combinations(s, r) for r in range(len(s) + 1)
+    ):
+        yield set(subset)
 
 
 def jointProbability(people, one_gene, two_genes, have_trait):
@@ -0,0 +1,593 @@
+import multiprocessing
+import sys
+
+import numpy as np
+
+from heredity import PROBS, loadData, printProbabilities
+
+# Variable Elimination:
+# Inference by enumeration (heredity.main) sums the joint probability over all 6^n assignments of genes and traits.
+# The joint probability is a product of small factors, each depending on only a few variables:
+#   P(Gene) for a person without known parents,
+#   P(Gene | MotherGene, FatherGene) for a person with known parents (including the mutation model),
+#   P(Trait | Gene) for every person.
+# A sum over a hidden variable only needs to include the factors that depend on it. Variable elimination
+# sums out one variable at a time: all factors containing the variable are multiplied and the variable is
+# summed out of the product, which gives a new (smaller) factor.
+# The only variables of the factor graph are the genes. A known trait is evidence: P(Trait = trait | Gene)
+# becomes a factor over Gene. An unknown trait is summed out right away:
+#   P(Trait) = sum_over_genes( P(Gene) * P(Trait | Gene) )
+# The order in which the variables are eliminated determines the size of the intermediate factors.
+# It is computed once with the min-degree heuristic (eliminate the variable with the fewest neighbors first).
+# Bucket Elimination:
+# Every factor is put into the bucket of its variable that comes first in the elimination order.
+# Eliminating a variable multiplies the factors of its bucket and sends the result (message) to the bucket of
+# the first variable of the result. The messages are computed once without a query and cached.
+# To get the distribution of the genes of one person, the persons variable is not summed out.
+# Only the message of the persons bucket and of the buckets its message passes through change,
+# all other cached messages are reused.
+
+# Index of a gene count in the factor tables
+GENES = [0, 1, 2]
+
+
+class Factor():
+    """
+    A function over some variables (gene of a person), stored as an array with one axis per variable.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = np.asarray(table, dtype=np.float64)
+
+
+def multiplyMarginal(factors, keep):
+    """
+    Return the product of all factors, with all variables that are not in `keep` summed out.
+    The result is scaled to a maximum of 1 to prevent underflow in large families
+    (all results are normalized at the end).
+    """
+    variables = list(dict.fromkeys(v for factor in factors for v in factor.variables))
+    labels = {v: i for i, v in enumerate(variables)}
+    remaining = [v for v in variables if v in keep]
+    operands = []
+    for factor in factors:
+        operands += [factor.table, [labels[v] for v in factor.variables]]
+    table = np.einsum(*operands, [labels[v] for v in remaining])
+    table_max = table.max()
+    if table_max > 0:
+        table = table / table_max
+    return Factor(remaining, table)
+
+
+def multiplySumOut(factors, variable=None):
+    """
+    Return the product of all factors, with `variable` summed out (if given).
+    """
+    keep = set(v for factor in factors for v in factor.variables) - {variable}
+    return multiplyMarginal(factors, keep)
+
+
+def inheritanceProbabilities():
+    """
+    Return the probability that a parent passes on the gene, given the number of genes of the parent.
+    """
+    mutation = PROBS["mutation"]
+    return np.array([mutation, 0.5, 1 - mutation])
+
+
+def childGeneTable():
+    """
+    Return P(Gene | MotherGene, FatherGene) as an array indexed by [mother genes, father genes, child genes].
+    """
+    inherit = inheritanceProbabilities()
+    mother = inherit[:, np.newaxis]
+    father = inherit[np.newaxis, :]
+    return np.stack([
+        (1 - mother) * (1 - father),
+        mother * (1 - father) + (1 - mother) * father,
+        mother * father
+    ], axis=-1)
+
+
+def traitTable():
+    """
+    Return P(Trait | Gene) as an array indexed by [genes, trait (0: False, 1: True)].
+    """
+    return np.array([[PROBS["trait"][genes][False], PROBS["trait"][genes][True]] for genes in GENES])
+
+
+def geneFactors(people):
+    """
+    Return the gene factor of every person: P(Gene | MotherGene, FatherGene) if the parents are known,
+    P(Gene) otherwise.
+    """
+    prior = np.array([PROBS["gene"][genes] for genes in GENES])
+    child = childGeneTable()
+    factors = []
+    for person in people:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother and father:
+            factors.append(Factor((mother, father, person), child))
+        else:
+            factors.append(Factor((person,), prior))
+    return factors
+
+
+def traitFactor(person, trait):
+    """
+    Return the evidence factor P(Trait = trait | Gene) of a person with a known trait.
+    """
+    return Factor((person,), traitTable()[:, int(trait)])
+
+
+def personProbabilities(gene, trait):
+    """
+    Return the gene and trait probability distribution of a person in the same format as heredity.main,
+    given the gene distribution and the known trait (None if unknown).
+    """
+    if trait is None:
+        trait_prob = gene @ traitTable()[:, 1]
+    else:
+        trait_prob = float(trait)
+    return {
+        "gene": {genes: float(gene[genes]) for genes in reversed(GENES)},
+        "trait": {True: float(trait_prob), False: float(1 - trait_prob)}
+    }
+
+
+class HeredityModel():
+    """
+    Factor graph of a family (as returned by loadData), built once.
+    """
+
+    def __init__(self, people):
+        self.people = people
+        self.factors = geneFactors(people)
+        # A known trait is evidence for the persons genes.
+        for person in people:
+            if people[person]["trait"] is not None:
+                self.factors.append(traitFactor(person, people[person]["trait"]))
+
+        self.elimination_order = self.minDegreeOrder()
+        self.position = {variable: i for i, variable in enumerate(self.elimination_order)}
+
+        # Put every factor into the bucket of its first variable.
+        self.buckets = {variable: [] for variable in self.elimination_order}
+        for factor in self.factors:
+            self.buckets[self.first(factor.variables)].append(factor)
+
+        # Eliminate all variables and cache the messages.
+        # self.incoming[variable] maps the buckets that sent a message to `variable` to their message.
+        self.incoming = {variable: dict() for variable in self.elimination_order}
+        for variable in self.elimination_order:
+            message = multiplySumOut(self.bucketFactors(variable), variable)
+            # A message without variables is a constant (the probability of the evidence), which is not needed.
+            if message.variables:
+                self.incoming[self.first(message.variables)][variable] = message
+
+    def first(self, variables):
+        """Return the variable that comes first in the elimination order."""
+        return min(variables, key=lambda variable: self.position[variable])
+
+    def bucketFactors(self, variable, replace=None):
+        """
+        Return the factors and received messages of a bucket.
+        replace is a (sender, message) tuple that replaces the cached message from sender.
+        """
+        messages = dict(self.incoming[variable])
+        if replace:
+            messages[replace[0]] = replace[1]
+        return self.buckets[variable] + list(messages.values())
+
+    def minDegreeOrder(self):
+        """
+        Return an order of all variables for elimination.
+        Eliminating a variable connects all of its neighbors.
+        """
+        neighbors = {person: set() for person in self.people}
+        for factor in self.factors:
+            for variable in factor.variables:
+                neighbors[variable].update(factor.variables)
+        for variable in neighbors:
+            neighbors[variable].discard(variable)
+
+        order = []
+        while neighbors:
+            variable = min(neighbors, key=lambda v: len(neighbors[v]))
+            for neighbor in neighbors[variable]:
+                neighbors[neighbor].update(neighbors[variable] - {neighbor})
+                neighbors[neighbor].discard(variable)
+            del neighbors[variable]
+            order.append(variable)
+        return order
+
+    def geneDistribution(self, person):
+        """
+        Return P(Gene | evidence) of a person as an array indexed by number of genes.
+        The persons bucket keeps its variable, then the message is passed on through the
+        buckets that depend on it, until only the persons variable is left.
+        """
+        sender = person
+        message = multiplySumOut(self.bucketFactors(person))
+        while len(message.variables) > 1:
+            receiver = self.first(v for v in message.variables if v != person)
+            message = multiplySumOut(self.bucketFactors(receiver, (sender, message)), receiver)
+            sender = receiver
+        return message.table / message.table.sum()
+
+    def probabilities(self):
+        """
+        Return the gene and trait probability distribution of every person,
+        in the same format as heredity.main.
+        """
+        return {
+            person: personProbabilities(self.geneDistribution(person), self.people[person]["trait"])
+            for person in self.people
+        }
+
+
+# Junction Tree:
+# A pedigree with cousin marriages has loops, so that variable elimination creates large intermediate factors
+# and has to be repeated for every query. A junction tree is compiled once:
+#   1. Moralize: connect every person with its parents and the parents with each other
+#      (every gene factor is then contained in a fully connected set of variables).
+#   2. Triangulate: eliminate the variables in min-fill order (the variable that adds the fewest new edges).
+#      Every variable and its remaining neighbors form a clique.
+#   3. Connect the maximal cliques into a tree that maximizes the number of shared variables (separators).
+#      Then every variable is contained in a connected part of the tree.
+# Every gene factor and trait evidence factor is assigned to a clique that contains its variables.
+# Shafer-Shenoy message passing: the message from clique i to neighbor j is the product of the factors of i
+# and the messages i received from all other neighbors, summed onto the separator of i and j.
+# The product of the factors of a clique and all of its incoming messages is the joint distribution of its variables.
+# Messages are cached. Changing the evidence of a clique only invalidates the messages that are sent away from it.
+class JunctionTree():
+    """
+    Junction tree of a family (as returned by loadData), compiled once.
+    """
+
+    def __init__(self, people):
+        self.people = people
+        self.traits = {person: people[person]["trait"] for person in people}
+        factors = geneFactors(people)
+        self.cliques = self.triangulate(factors)
+        self.neighbors = self.connectCliques()
+
+        # Assign every factor to the smallest clique containing its variables.
+        self.clique_factors = [[] for _ in self.cliques]
+        for factor in factors:
+            self.clique_factors[self.hostClique(factor.variables)].append(factor)
+        self.person_clique = {person: self.hostClique((person,)) for person in people}
+        self.evidence = dict()
+        for person in people:
+            if self.traits[person] is not None:
+                self.evidence[person] = traitFactor(person, self.traits[person])
+
+        # self.messages[(i, j)] is the cached message from clique i to clique j
+        self.messages = dict()
+
+    def triangulate(self, factors):
+        """
+        Return the maximal cliques of the triangulated moral graph.
+        """
+        neighbors = {person: set() for person in self.people}
+        for factor in factors:
+            for variable in factor.variables:
+                neighbors[variable].update(factor.variables)
+        for variable in neighbors:
+            neighbors[variable].discard(variable)
+
+        def fillIn(variable):
+            """Return the number of edges that eliminating variable would add."""
+            variable_neighbors = list(neighbors[variable])
+            return sum(
+                1 for i, a in enumerate(variable_neighbors) for b in variable_neighbors[i + 1:]
+                if b not in neighbors[a]
+            )
+
+        cliques = []
+        while neighbors:
+            variable = min(neighbors, key=lambda v: (fillIn(v), len(neighbors[v])))
+            clique = frozenset(neighbors[variable] | {variable})
+            if not any(clique <= other for other in cliques):
+                cliques.append(clique)
+            for neighbor in neighbors[variable]:
+                neighbors[neighbor].update(neighbors[variable] - {neighbor})
+                neighbors[neighbor].discard(variable)
+            del neighbors[variable]
+        return [tuple(sorted(clique)) for clique in cliques]
+
+    def connectCliques(self):
+        """
+        Return the neighbors of every clique in a maximum spanning tree of the cliques,
+        where the weight of an edge is the number of shared variables (Kruskal's algorithm).
+        Cliques without shared variables (separate families) are connected with empty separators.
+        """
+        edges = sorted(
+            ((len(set(a) & set(b)), i, j) for i, a in enumerate(self.cliques)
+             for j, b in enumerate(self.cliques) if i < j),
+            reverse=True
+        )
+        component = list(range(len(self.cliques)))
+
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+
+        neighbors = [[] for _ in self.cliques]
+        for _, i, j in edges:
+            if find(i) != find(j):
+                component[find(i)] = find(j)
+                neighbors[i].append(j)
+                neighbors[j].append(i)
+        return neighbors
+
+    def hostClique(self, variables):
+        """Return the smallest clique that contains all variables."""
+        return min(
+            (i for i, clique in enumerate(self.cliques) if set(variables) <= set(clique)),
+            key=lambda i: len(self.cliques[i])
+        )
+
+    def cliqueFactors(self, clique):
+        """Return the gene factors and evidence factors of a clique."""
+        evidence = [factor for person, factor in self.evidence.items() if self.person_clique[person] == clique]
+        return self.clique_factors[clique] + evidence
+
+    def collect(self, root):
+        """
+        Compute all missing messages that are sent towards the root clique.
+        The cliques are visited in depth first order, then the messages are computed from the leaves to the root.
+        """
+        parent = {root: None}
+        order = [root]
+        for clique in order:
+            for neighbor in self.neighbors[clique]:
+                if neighbor not in parent:
+                    parent[neighbor] = clique
+                    order.append(neighbor)
+        for clique in reversed(order[1:]):
+            if (clique, parent[clique]) not in self.messages:
+                self.messages[(clique, parent[clique])] = self.computeMessage(clique, parent[clique])
+
+    def computeMessage(self, sender, receiver):
+        """Return the message from clique sender to clique receiver."""
+        factors = self.cliqueFactors(sender) + [
+            self.messages[(neighbor, sender)] for neighbor in self.neighbors[sender] if neighbor != receiver
+        ]
+        separator = set(self.cliques[sender]) & set(self.cliques[receiver])
+        return multiplyMarginal(factors, separator)
+
+    def setTrait(self, person, trait):
+        """
+        Set the known trait of a person (None if unknown).
+        Only the messages that depend on the evidence of the persons clique are invalidated.
+        """
+        self.traits[person] = trait
+        if trait is None:
+            self.evidence.pop(person, None)
+        else:
+            self.evidence[person] = traitFactor(person, trait)
+
+        # Remove all messages that are sent away from the persons clique.
+        clique = self.person_clique[person]
+        visited = {clique}
+        stack = [clique]
+        while stack:
+            sender = stack.pop()
+            for receiver in self.neighbors[sender]:
+                if receiver not in visited:
+                    self.messages.pop((sender, receiver), None)
+                    visited.add(receiver)
+                    stack.append(receiver)
+
+    def geneDistribution(self, person):
+        """
+        Return P(Gene | evidence) of a person as an array indexed by number of genes.
+        """
+        clique = self.person_clique[person]
+        self.collect(clique)
+        factors = self.cliqueFactors(clique) + [
+            self.messages[(neighbor, clique)] for neighbor in self.neighbors[clique]
+        ]
+        distribution = multiplyMarginal(factors, {person}).table
+        return distribution / distribution.sum()
+
+    def probabilities(self):
+        """
+        Return the gene and trait probability distribution of every person,
+        in the same format as heredity.main.
+        """
+        return {
+            person: personProbabilities(self.geneDistribution(person), self.traits[person])
+            for person in self.people
+        }
+
+
+# Vectorized Enumeration:
+# Reference implementation of inference by enumeration (as in heredity.main) that evaluates a block of
+# assignments at once. Every person has an index, an assignment is a row of gene counts and a row of traits.
+# Assignment number k encodes the gene count of person i in digit i (base 3) and the unknown traits in the
+# following bits. Known traits are evidence and are never enumerated.
+# The joint probability is computed in log space (sum of log probabilities instead of a product),
+# so that it does not underflow for large families. The probabilities of a block are scaled by the largest
+# log probability seen so far before they are added to the marginals.
+class EnumerationKernel():
+    """
+    Family (as returned by loadData) encoded as integer arrays for enumeration.
+    """
+
+    def __init__(self, people):
+        self.people = list(people)
+        self.num_people = len(self.people)
+        index = {person: i for i, person in enumerate(self.people)}
+
+        # Index of the parents of every person, -1 if the parents are not known
+        self.mother = np.array([index[people[p]["mother"]] if people[p]["mother"] and people[p]["father"]
+                                else -1 for p in self.people], dtype=np.int64)
+        self.father = np.array([index[people[p]["father"]] if self.mother[i] >= 0 else -1
+                                for i, p in enumerate(self.people)], dtype=np.int64)
+        self.children = np.flatnonzero(self.mother >= 0)
+        self.founders = np.flatnonzero(self.mother < 0)
+
+        # Known traits (-1 if unknown)
+        self.known_traits = np.array([-1 if people[p]["trait"] is None else int(people[p]["trait"])
+                                      for p in self.people], dtype=np.int64)
+        self.unknown_traits = np.flatnonzero(self.known_traits < 0)
+        self.num_assignments = 3 ** self.num_people * 2 ** len(self.unknown_traits)
+
+        with np.errstate(divide="ignore"):
+            self.log_prior = np.log([PROBS["gene"][genes] for genes in GENES])
+            self.log_child = np.log(childGeneTable())
+            self.log_trait = np.log(traitTable())
+
+    def assignments(self, start, stop):
+        """
+        Return the gene counts and traits (arrays of shape (assignments, people))
+        of the assignments with numbers start to stop - 1.
+        """
+        numbers = np.arange(start, stop, dtype=np.int64)
+        genes = np.empty((len(numbers), self.num_people), dtype=np.int64)
+        for i in range(self.num_people):
+            numbers, genes[:, i] = np.divmod(numbers, 3)
+        traits = np.broadcast_to(self.known_traits, genes.shape).copy()
+        for i in self.unknown_traits:
+            numbers, traits[:, i] = np.divmod(numbers, 2)
+        return genes, traits
+
+    def logJointProbability(self, genes, traits):
+        """
+        Return the log joint probability of every assignment (row) of gene counts and traits.
+        """
+        log_p = self.log_prior[genes[:, self.founders]].sum(axis=1)
+        log_p += self.log_child[
+            genes[:, self.mother[self.children]], genes[:, self.father[self.children]], genes[:, self.children]
+        ].sum(axis=1)
+        log_p += self.log_trait[genes, traits].sum(axis=1)
+        return log_p
+
+    def logSums(self, start, stop, block_size=65536):
+        """
+        Return the sums of the joint probabilities of the assignments with numbers start to stop - 1
+        for every value of every person, scaled by exp(-log_scale):
+        a tuple (gene sums of shape (people, 3), trait sums of shape (people, 2), log_scale).
+        """
+        gene_sums = np.zeros((self.num_people, len(GENES)))
+        trait_sums = np.zeros((self.num_people, 2))
+        people = np.arange(self.num_people)
+        log_scale = -np.inf
+
+        for block_start in range(start, stop, block_size):
+            genes, traits = self.assignments(block_start, min(block_start + block_size, stop))
+            log_p = self.logJointProbability(genes, traits)
+            block_max = log_p.max()
+            if block_max == -np.inf:
+                continue
+            # Rescale the sums if this block contains a larger probability than all previous blocks.
+            if block_max > log_scale:
+                gene_sums *= np.exp(log_scale - block_max)
+                trait_sums *= np.exp(log_scale - block_max)
+                log_scale = block_max
+            # Add the joint probability of every assignment to the value of every person in the assignment
+            # (a histogram over (person, value) pairs, weighted by the joint probability).
+            joint_p = np.repeat(np.exp(log_p - log_scale), self.num_people)
+            gene_sums += np.bincount(
+                (people * len(GENES) + genes).ravel(), weights=joint_p, minlength=gene_sums.size
+            ).reshape(gene_sums.shape)
+            trait_sums += np.bincount(
+                (people * 2 + traits).ravel(), weights=joint_p, minlength=trait_sums.size
+            ).reshape(trait_sums.shape)
+        return gene_sums, trait_sums, log_scale
+
+    def distributions(self, gene_sums, trait_sums):
+        """
+        Return the normalized sums as the gene and trait probability distribution of every person,
+        in the same format as heredity.main.
+        """
+        gene_sums = gene_sums / gene_sums.sum(axis=1, keepdims=True)
+        trait_sums = trait_sums / trait_sums.sum(axis=1, keepdims=True)
+        return {
+            person: {
+                "gene": {genes: float(gene_sums[i, genes]) for genes in reversed(GENES)},
+                "trait": {True: float(trait_sums[i, 1]), False: float(trait_sums[i, 0])}
+            }
+            for i, person in enumerate(self.people)
+        }
+
+    def probabilities(self, block_size=65536):
+        """
+        Return the gene and trait probability distribution of every person,
+        in the same format as heredity.main.
+        """
+        gene_sums, trait_sums, _ = self.logSums(0, self.num_assignments, block_size)
+        return self.distributions(gene_sums, trait_sums)
+
+    def parallelProbabilities(self, processes=None, chunk_size=2 ** 20):
+        """
+        Return the same distributions as probabilities, with the assignments split into chunks of
+        chunk_size numbers that are enumerated by a process pool.
+        """
+        chunks = [
+            (start, min(start + chunk_size, self.num_assignments))
+            for start in range(0, self.num_assignments, chunk_size)
+        ]
+        with multiprocessing.Pool(processes, initializer=initEnumerationWorker, initargs=(self,)) as pool:
+            results = pool.map(enumerateChunk, chunks)
+        gene_sums, trait_sums, _ = combineLogSums(results)
+        return self.distributions(gene_sums, trait_sums)
+
+
+# Parallel Enumeration:
+# The assignment numbers 0 to num_assignments - 1 are split into chunks, and every worker process returns the
+# sums of its chunk (EnumerationKernel.logSums). Every chunk has its own log scale, so the sums are rescaled
+# to the largest log scale of all chunks before they are added.
+
+# The kernel is sent to every worker process only once.
+worker_kernel = None
+
+
+def initEnumerationWorker(kernel):
+    global worker_kernel
+    worker_kernel = kernel
+
+
+def enumerateChunk(chunk):
+    """Return the log-scaled sums of the assignments with numbers chunk[0] to chunk[1] - 1."""
+    return worker_kernel.logSums(*chunk)
+
+
+def combineLogSums(results):
+    """
+    Return the sums (gene sums, trait sums, log_scale) of a list of (gene sums, trait sums, log_scale) tuples.
+    """
+    log_scale = max(result[2] for result in results)
+    gene_sums = np.zeros_like(results[0][0])
+    trait_sums = np.zeros_like(results[0][1])
+    for chunk_gene_sums, chunk_trait_sums, chunk_log_scale in results:
+        # A chunk without any possible assignment has only zero sums.
+        if chunk_log_scale > -np.inf:
+            gene_sums += chunk_gene_sums * np.exp(chunk_log_scale - log_scale)
+            trait_sums += chunk_trait_sums * np.exp(chunk_log_scale - log_scale)
+    return gene_sums, trait_sums, log_scale
+
+
+# Inference methods of main
+METHODS = {
+    "elimination": lambda people: HeredityModel(people).probabilities(),
+    "junction": lambda people: JunctionTree(people).probabilities(),
+    "enumeration": lambda people: EnumerationKernel(people).parallelProbabilities(),
+}
+
+
+def main():
+    if len(sys.argv) not in (2, 3) or len(sys.argv) == 3 and sys.argv[2] not in METHODS:
+        sys.exit(f"Usage: python heredity_engine.py data.csv [{'|'.join(METHODS)}]")
+    method = sys.argv[2] if len(sys.argv) == 3 else "elimination"
+    printProbabilities(METHODS[method](loadData(sys.argv[1])))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,12 @@
 import random
 import math
+import multiprocessing
+import time
+from collections import deque
+
+import numpy as np
+
+from hospitals_engine import CostEngine, pMedian, setCosts
 
 # Hill Climbing:
 # The neighbor states are compared to the current state,
@@ -15,6 +22,46 @@ import math
 # Houses and Hospitals are placed on a grid. Find the optimal position for the hospitals,
 # so that the sum of the manhattan distances from each house to the nearest hospital is minimized.
 
+# The cost of the neighbor states is computed incrementally by the CostEngine (see hospitals_engine.py),
+# which caches the nearest and second-nearest hospital of every house.
+
+# Simulated Annealing:
+# In every step, a random neighbor is chosen. A better neighbor is always accepted, a worse neighbor only with
+# probability e^(-ΔE / T), where ΔE is the increase of the cost and T the temperature.
+# The temperature is lowered by a cooling schedule, so that worse neighbors are accepted often at the start
+# (which allows escaping local optima) and rarely at the end.
+
+# Tabu Search:
+# In every step, move to the best neighbor, even if it is worse than the current state.
+# To avoid moving back and forth between the same states, a hospital is not allowed to move to a cell
+# that a hospital has left in the last `tenure` steps, unless that leads to a new best state.
+
+# Parallel Local Search:
+# The trials of a local search (starting from different random states) are independent,
+# so they are run in a process pool. Every trial gets its own random seed, derived from one seed for all trials.
+
+# Images:
+# With image_prefix, the states are drawn by a FrameRenderer (see hospitals_renderer.py), which only redraws
+# the cells that changed and writes the frames in a background thread.
+
+# Cooling schedules: temperature at step k, given the initial temperature and the cooling rate
+COOLING_SCHEDULES = {
+    "exponential": lambda initial, rate, k: initial * rate ** k,
+    "linear": lambda initial, rate, k: max(initial - rate * k, 0),
+    "logarithmic": lambda initial, rate, k: initial / (1 + rate * math.log(1 + k)),
+}
+
+# Default cooling rate of every schedule, given the initial temperature and the number of steps.
+# The rates have different meanings, so one default can't fit all schedules
+# (e.g. a linear decrease of 0.999 per step would reach 0 after a few steps).
+# The linear schedule reaches 0 at the last step.
+DEFAULT_COOLING_RATES = {
+    "exponential": lambda initial, max_iter: 0.999,
+    "linear": lambda initial, max_iter: initial / max_iter,
+    "logarithmic": lambda initial, max_iter: 1.0,
+}
+
+
 class Space():
 
     def __init__(self, height, width, num_hospitals):
@@ -46,67 +93,249 @@ class Space():
             candidates.remove(hospital)
         return candidates
 
-    def hillClimb(self, max_iter=None, image_prefix=None, log=False):
-        """Performs hill-climbing to find a solution."""
+    def hillClimb(self, max_iter=None, image_prefix=None, gif=False, log=False):
+        """
+        Performs hill-climbing to find a solution.
+        With image_prefix, every state is written as a frame (to a PNG sequence, or to one GIF if gif is set).
+        """
         count = 0
+        renderer = None
+        if image_prefix:
+            from hospitals_renderer import FrameRenderer
+            renderer = FrameRenderer(self, image_prefix, gif)
 
         # Start by initializing hospitals randomly
-        self.hospitals = set()
-        for i in range(self.num_hospitals):
-            self.hospitals.add(random.choice(list(self.availableSpaces())))
+        engine = self.randomState()
         if log:
-            print("Initial state: cost", self.getCost(self.hospitals))
-        if image_prefix:
-            self.outputImage(f"{image_prefix}{str(count).zfill(3)}.png")
-
-        # Continue until reaching maximum number of iterations
-        while max_iter is None or count < max_iter:
-            count += 1
-            best_neighbors = []
-            best_neighbor_cost = math.inf
-
-            # Consider all hospitals to move
-            for hospital in self.hospitals:
-
-                # Consider all neighbors for that hospital
-                for replacement in self.getNeighbors(*hospital):
-
-                    # Generate a neighboring set of hospitals
-                    # (Set of hospitals where the hospital to move is replaced by a neighboring position)
-                    neighbor = self.hospitals.copy()
-                    neighbor.remove(hospital)
-                    neighbor.add(replacement)
-
-                    # Check if neighbor is best so far
-                    cost = self.getCost(neighbor)
-                    if cost < best_neighbor_cost:
-                        best_neighbor_cost = cost
-                        best_neighbors = [neighbor]
-                    elif best_neighbor_cost == cost:
-                        best_neighbors.append(neighbor)
-
-            # None of the neighbors are better than the current state
-            if best_neighbor_cost >= self.getCost(self.hospitals):
-                return self.hospitals
-
-            # Move to a neighbor with the lowest cost
-            else:
+            print("Initial state: cost", engine.cost)
+        if renderer:
+            renderer.write(self.hospitals, engine.cost)
+
+        try:
+            # Continue until reaching maximum number of iterations
+            while max_iter is None or count < max_iter:
+                count += 1
+                best_neighbors = []
+                best_neighbor_cost = math.inf
+
+                # Consider all neighbors of the current state
+                moves, costs = self.getMoves(engine)
+                if moves:
+                    best_neighbor_cost = int(costs.min())
+                    best_neighbors = [move for move, cost in zip(moves, costs.tolist()) if cost == best_neighbor_cost]
+
+                # None of the neighbors are better than the current state
+                if best_neighbor_cost >= engine.cost:
+                    return self.hospitals
+
+                # Move to a neighbor with the lowest cost
+                else:
+                    if log:
+                        print(f"Found better neighbor: cost {best_neighbor_cost}")
+                    index, hospital, replacement = random.choice(best_neighbors)
+                    engine.move(index, replacement)
+                    self.hospitals = self.hospitals - {hospital} | {replacement}
+
+                # Generate image
+                if renderer:
+                    renderer.write(self.hospitals, engine.cost)
+        finally:
+            # Wait until all frames are written
+            if renderer:
+                renderer.close()
+
+    def randomState(self):
+        """Places the hospitals randomly. Returns a CostEngine for the new state."""
+        # All cells without a house are available, the hospitals of the previous state are replaced.
+        cells = [(row, col) for row in range(self.height) for col in range(self.width) if (row, col) not in self.houses]
+        self.hospitals = set(random.sample(cells, self.num_hospitals))
+        return CostEngine(self.houses, self.hospitals)
+
+    def getMoves(self, engine):
+        """
+        Returns all moves to a neighbor state as (hospital index, hospital, replacement) tuples,
+        and an array with the costs of the neighbor states.
+        A neighboring set of hospitals is the current set where the hospital to move
+        is replaced by a neighboring position.
+        """
+        moves = [
+            (index, hospital, replacement)
+            for index, hospital in enumerate(engine.positions())
+            for replacement in self.getNeighbors(*hospital)
+        ]
+        # The costs of all neighbors are computed at once from the cached distances
+        costs = engine.cost + engine.moveDeltas(
+            [index for index, _, _ in moves], [replacement for _, _, replacement in moves]
+        )
+        return moves, costs
+
+    def simulatedAnnealing(self, max_iter=10000, temperature=None, schedule="exponential", cooling_rate=None,
+                           log=False):
+        """
+        Performs simulated annealing to find a solution. Returns the best state found.
+        If temperature is None, the initial temperature is the mean cost difference to the neighbors
+        of the random start state. cooling_rate is the factor per step (exponential schedule, between 0 and 1),
+        the decrease per step (linear schedule) or the scale of the logarithm (logarithmic schedule).
+        If cooling_rate is None, the default of the schedule is used (see DEFAULT_COOLING_RATES).
+        """
+        if schedule not in COOLING_SCHEDULES:
+            raise ValueError(f"unknown schedule {schedule}, choose one of {', '.join(COOLING_SCHEDULES)}")
+        if cooling_rate is not None and (cooling_rate <= 0 or schedule == "exponential" and cooling_rate >= 1):
+            raise ValueError(f"invalid cooling rate {cooling_rate} for the {schedule} schedule")
+        cool = COOLING_SCHEDULES[schedule]
+        engine = self.randomState()
+        if temperature is None:
+            moves, costs = self.getMoves(engine)
+            temperature = float(np.abs(costs - engine.cost).mean()) if moves else 1.0
+        if cooling_rate is None:
+            cooling_rate = DEFAULT_COOLING_RATES[schedule](temperature, max_iter)
+        best_hospitals = self.hospitals
+        best_cost = engine.cost
+        if log:
+            print("Initial state: cost", best_cost)
+
+        for count in range(max_iter):
+            current_temperature = cool(temperature, cooling_rate, count)
+            if current_temperature <= 0:
+                break
+
+            # Choose a random neighbor
+            index = random.randrange(self.num_hospitals)
+            hospital = engine.positions()[index]
+            neighbors = self.getNeighbors(*hospital)
+            if not neighbors:
+                continue
+            replacement = random.choice(neighbors)
+            delta = engine.moveDelta(index, replacement)
+
+            # Accept a better neighbor, or a worse neighbor with probability e^(-ΔE / T)
+            if delta <= 0 or random.random() < math.exp(-delta / current_temperature):
+                engine.move(index, replacement)
+                self.hospitals = self.hospitals - {hospital} | {replacement}
+                if engine.cost < best_cost:
+                    best_cost = engine.cost
+                    best_hospitals = self.hospitals
+                    if log:
+                        print(f"{count}: Found better state: cost {best_cost}")
+
+        self.hospitals = best_hospitals
+        return best_hospitals
+
+    def tabuSearch(self, max_iter=200, tenure=10, log=False):
+        """
+        Performs tabu search to find a solution. Returns the best state found.
+        """
+        engine = self.randomState()
+        best_hospitals = self.hospitals
+        best_cost = engine.cost
+        tabu = deque(maxlen=tenure)
+        if log:
+            print("Initial state: cost", best_cost)
+
+        for count in range(max_iter):
+            moves, costs = self.getMoves(engine)
+
+            # Moves to a tabu cell are only allowed if they lead to a new best state
+            allowed = [
+                (cost, move) for move, cost in zip(moves, costs.tolist())
+                if move[2] not in tabu or cost < best_cost
+            ]
+            if not allowed:
+                break
+            cost = min(cost for cost, _ in allowed)
+            index, hospital, replacement = random.choice([move for c, move in allowed if c == cost])
+
+            engine.move(index, replacement)
+            self.hospitals = self.hospitals - {hospital} | {replacement}
+            tabu.append(hospital)
+            if cost < best_cost:
+                best_cost = cost
+                best_hospitals = self.hospitals
                 if log:
-                    print(f"Found better neighbor: cost {best_neighbor_cost}")
-                self.hospitals = random.choice(best_neighbors)
+                    print(f"{count}: Found better state: cost {best_cost}")
+
+        self.hospitals = best_hospitals
+        return best_hospitals
+
+    def localSearch(self, num_repeat, method="hillClimb", processes=None, seed=None, log=False, **options):
+        """
+        Runs num_repeat trials of a local search method ("hillClimb", "simulatedAnnealing" or "tabuSearch")
+        in a process pool, each with its own random seed. Further options are passed to the method.
+        Returns the best hospitals, their cost and a list with statistics of every trial.
+        """
+        seeds = random.Random(seed).sample(range(2 ** 32), num_repeat)
+        trials = [(self, method, trial_seed, options) for trial_seed in seeds]
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(runTrial, trials)
+
+        best_hospitals = None
+        best_cost = math.inf
+        statistics = []
+        for i, (hospitals, trial_statistics) in enumerate(results):
+            statistics.append(dict(trial=i, **trial_statistics))
+            if trial_statistics["cost"] < best_cost:
+                best_cost = trial_statistics["cost"]
+                best_hospitals = hospitals
+            if log:
+                print(f"{i}: cost {trial_statistics['cost']} in {trial_statistics['time']:.3f}s")
+
+        self.hospitals = best_hospitals
+        return best_hospitals, best_cost, statistics
 
-            # Generate image
-            if image_prefix:
-                self.outputImage(f"{image_prefix}{str(count).zfill(3)}.png")
+    def exactSolve(self, num_repeat=10, time_limit=None, log=False):
+        """
+        Finds the optimal hospital placement with a mixed-integer program (see hospitals_engine.py).
+        The best result of num_repeat hill-climbing trials is used as upper bound of the cost (the solver
+        cannot be warm-started), and returned if the solver does not find a better solution within time_limit seconds.
+        Returns the hospitals, their cost and the optimality gap (0 if the placement is optimal).
+        """
+        heuristic = None
+        heuristic_cost = math.inf
+        for i in range(num_repeat):
+            hospitals = self.hillClimb()
+            cost = self.getCost(hospitals)
+            if cost < heuristic_cost:
+                heuristic, heuristic_cost = hospitals, cost
+        if log and heuristic is not None:
+            print(f"Hill climbing: cost {heuristic_cost}")
+
+        self.hospitals = set()
+        sites = sorted(self.availableSpaces())
+        chosen, cost, lower_bound = pMedian(
+            list(self.houses), sites, self.num_hospitals,
+            upper_bound=None if heuristic is None else heuristic_cost,
+            time_limit=time_limit
+        )
+        if chosen is not None and cost <= heuristic_cost:
+            self.hospitals = {sites[j] for j in chosen}
+        elif heuristic is not None:
+            self.hospitals, cost = heuristic, heuristic_cost
+        else:
+            raise ValueError("no solution found within the time limit (and no hill-climbing trials)")
+
+        if cost == 0:
+            gap = 0.0
+        elif lower_bound is None:
+            gap = math.inf
+        else:
+            gap = max(0.0, (cost - lower_bound) / cost)
+        if log:
+            print(f"Exact solver: cost {cost}, lower bound {lower_bound}, gap {gap:.2%}")
+        return self.hospitals, cost, gap
 
-    def randomRestart(self, num_repeat, image_prefix=None, log=False):
+    def randomRestart(self, num_repeat, image_prefix=None, gif=False, log=False):
         """
         Repeats hill-climbing multiple times. Each time, start from a random state.
         Compare the cost from every trial, and choose the lowest amongst those.
+        With image_prefix, the result of every trial is written as a frame (to a PNG sequence, or to one GIF).
         """
         best_hospitals = None
         best_cost = math.inf
         best_state = 0
+        renderer = None
+        if image_prefix:
+            from hospitals_renderer import FrameRenderer
+            renderer = FrameRenderer(self, image_prefix, gif)
 
         # Repeat hill-climbing a fixed number of times
         for i in range(num_repeat):
@@ -122,9 +351,11 @@ class Space():
                 if log:
                     print(f"{i}: Found state: cost {cost}")
 
-            if image_prefix:
-                self.outputImage(f"{image_prefix}{str(i).zfill(3)}.png")
+            if renderer:
+                renderer.write(hospitals, cost)
 
+        if renderer:
+            renderer.close()
         print(f"best state: {best_state}, best cost: {best_cost}")
 
         return best_hospitals
@@ -134,13 +365,15 @@ class Space():
         Cost Function.
         Calculates sum of distances from houses to nearest hospital.
         """
-        cost = 0
-        for house in self.houses:
-            cost += min(
-                abs(house[0] - hospital[0]) + abs(house[1] - hospital[1])
-                for hospital in hospitals
-            )
-        return cost
+        return int(self.getCosts([list(hospitals)])[0])
+
+    def getCosts(self, hospital_sets):
+        """
+        Calculates the cost of many sets of hospitals (each a list of (row, col)) at once.
+        """
+        if not self.houses:
+            return np.zeros(len(hospital_sets), dtype=np.int64)
+        return setCosts(list(self.houses), hospital_sets)
 
     def getNeighbors(self, row, col):
         """
@@ -163,68 +396,39 @@ class Space():
 
     def outputImage(self, filename):
         """Generates image with all houses and hospitals."""
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        cost_size = 40
-        padding = 10
-
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.width * cell_size,
-             self.height * cell_size + cost_size + padding * 2),
-            "white"
-        )
-        house = Image.open("assets/images/House.png").resize(
-            (cell_size, cell_size)
-        )
-        hospital = Image.open("assets/images/Hospital.png").resize(
-            (cell_size, cell_size)
-        )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 30)
-        draw = ImageDraw.Draw(img)
-
-        for i in range(self.height):
-            for j in range(self.width):
-
-                # Draw cell
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                draw.rectangle(rect, fill="black")
-
-                if (i, j) in self.houses:
-                    img.paste(house, rect[0], house)
-                if (i, j) in self.hospitals:
-                    img.paste(hospital, rect[0], hospital)
-
-        # Add cost
-        draw.rectangle(
-            (0, self.height * cell_size, self.width * cell_size,
-             self.height * cell_size + cost_size + padding * 2),
-            "black"
-        )
-        draw.text(
-            (padding, self.height * cell_size + padding),
-            f"Cost: {self.getCost(self.hospitals)}",
-            fill="white",
-            font=font
-        )
-
-        img.save(filename)
-
-
-# Create a new space and add houses randomly
-space = Space(height=10, width=20, num_hospitals=3)
-for i in range(15):
-    space.addHouse(random.randrange(space.height), random.randrange(space.width))
-
-# Use Hill Climb to determine hospital placement
-# hospitals = s.hillClimb(image_prefix="hospitals", log=True)
-
-# Use Hill Climb with random restart to determine hospital placement
-hospitals = space.randomRestart(20, image_prefix="hospitals", log=True)
+        from hospitals_renderer import FrameRenderer
+        FrameRenderer(self).draw(self.hospitals, self.getCost(self.hospitals)).save(filename)
+
+
+def runTrial(trial):
+    """Runs one local search trial (in a worker process). Returns the hospitals and statistics of the trial."""
+    space, method, seed, options = trial
+    random.seed(seed)
+    start = time.perf_counter()
+    hospitals = getattr(space, method)(**options)
+    return hospitals, dict(
+        seed=seed,
+        cost=space.getCost(hospitals),
+        time=time.perf_counter() - start
+    )
+
+
+if __name__ == "__main__":
+    # Create a new space and add houses randomly
+    space = Space(height=10, width=20, num_hospitals=3)
+    for i in range(15):
+        space.addHouse(random.randrange(space.height), random.randrange(space.width))
+
+    # Use Hill Climb to determine hospital placement
+    # hospitals = s.hillClimb(image_prefix="hospitals", log=True)
+
+    # Use Hill Climb with random restart to determine hospital placement
+    hospitals = space.randomRestart(20, image_prefix="hospitals", log=True)
+    # hospitals = space.randomRestart(20, image_prefix="hospitals", gif=True, log=True)
+
+    # Use parallel Simulated Annealing or Tabu Search to determine hospital placement
+    # hospitals, cost, statistics = space.localSearch(20, method="simulatedAnnealing", schedule="exponential")
+    # hospitals, cost, statistics = space.localSearch(20, method="tabuSearch", tenure=10)
+
+    # Use the exact solver to determine the optimal hospital placement
+    # hospitals, cost, gap = space.exactSolve(log=True)
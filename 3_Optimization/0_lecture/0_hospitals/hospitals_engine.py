@@ -0,0 +1,200 @@
+import numpy as np
+import scipy.optimize
+import scipy.sparse
+
+# Incremental Cost Engine:
+# getCost computes the distance from every house to every hospital, and hill climbing calls it
+# for every neighbor state. But a neighbor only differs from the current state by one moved hospital.
+# For every house, the engine caches the distance to its nearest hospital (and which hospital that is)
+# and the distance to its second-nearest hospital. If hospital j moves to position p, the new distance of a house is
+#   min(distance to p, second-nearest distance)  if j was its nearest hospital
+#   min(distance to p, nearest distance)         otherwise
+# so the cost change of a move only needs the distances from the houses to p, no other hospital.
+# After a move, only the houses that used the moved hospital as nearest or second-nearest
+# have to be compared with all hospitals again.
+
+# Vectorized Cost Model:
+# The costs of many candidate sets of hospitals are computed at once with a broadcasted distance array
+# distances[set, house, hospital], whose minimum over the hospitals is summed over the houses.
+# The candidate sets are processed in chunks, so that the array never has more than max_elements entries.
+# The same is done for many moves of the CostEngine: a whole neighborhood is scored by one array operation.
+
+# Exact p-median Solver (Mixed-Integer Linear Programming):
+# Hill climbing only finds a local optimum. The problem can also be solved exactly as a mixed-integer program,
+# with the same kind of linear objective and constraints as linear programming (see production.py),
+# but some variables restricted to integers.
+# Variables: y_j = 1 if a hospital is placed on site j (binary), x_ij = 1 if house i uses the hospital on site j.
+# Cost Function: sum_over_i_j( distance(i, j) * x_ij )
+# Constraint 1: sum_over_j( x_ij ) = 1 for every house i (every house uses one hospital)
+# Constraint 2: x_ij - y_j <= 0 (a house can only use a site with a hospital)
+# Constraint 3: sum_over_j( y_j ) = number of hospitals
+# x_ij does not need to be integral: for integral y, the best x assigns every house to its nearest hospital.
+# scipy.optimize.milp cannot be warm-started from a heuristic solution. But the cost of a heuristic solution
+# is an upper bound of the optimal cost, so it is added as
+# Constraint 4: cost <= heuristic cost, which lets the solver discard worse branches early.
+# The solver reports a lower bound of the optimal cost. The optimality gap (cost - lower bound) / cost
+# is 0 if the solution is optimal, and shows how far from optimal it can be if the solver was stopped early.
+
+# Distance used for the second-nearest hospital if there is only one hospital
+NO_HOSPITAL = np.iinfo(np.int64).max // 4
+
+
+def chunks(num_rows, row_size, max_elements):
+    """Yield slices of at most max_elements // row_size rows (at least one row)."""
+    step = max(1, max_elements // max(1, row_size))
+    for start in range(0, num_rows, step):
+        yield slice(start, min(start + step, num_rows))
+
+
+def setCosts(houses, hospital_sets, max_elements=2 ** 22):
+    """
+    Return the cost of every set of hospitals.
+    houses is an array of shape (houses, 2), hospital_sets an array of shape (sets, hospitals, 2).
+    """
+    houses = np.asarray(houses, dtype=np.int64).reshape(-1, 2)
+    hospital_sets = np.asarray(hospital_sets, dtype=np.int64)
+    costs = np.empty(len(hospital_sets), dtype=np.int64)
+    for rows in chunks(len(hospital_sets), len(houses) * hospital_sets.shape[1], max_elements):
+        distances = np.abs(houses[np.newaxis, :, np.newaxis, :] - hospital_sets[rows, np.newaxis, :, :]).sum(axis=3)
+        costs[rows] = distances.min(axis=2).sum(axis=1)
+    return costs
+
+
+def pMedian(houses, sites, num_hospitals, upper_bound=None, time_limit=None):
+    """
+    Place num_hospitals hospitals on the sites (array of shape (sites, 2)), so that the sum of distances from
+    the houses (array of shape (houses, 2)) to the nearest hospital is minimal.
+    Return the indices of the chosen sites (None if no solution was found), their cost and the lower bound
+    of the optimal cost (None if unknown).
+    """
+    houses = np.asarray(houses, dtype=np.int64).reshape(-1, 2)
+    sites = np.asarray(sites, dtype=np.int64).reshape(-1, 2)
+    num_houses, num_sites = len(houses), len(sites)
+    # distances[house, site]
+    distances = np.abs(houses[:, np.newaxis, :] - sites[np.newaxis, :, :]).sum(axis=2).ravel()
+    num_pairs = num_houses * num_sites
+
+    # Variables: y_0..y_m-1, followed by x_ij at position m + i * m + j
+    cost = np.concatenate([np.zeros(num_sites), distances])
+    x = num_sites + np.arange(num_pairs)
+    site_of_pair = np.tile(np.arange(num_sites), num_houses)
+    house_of_pair = np.repeat(np.arange(num_houses), num_sites)
+    constraints = [
+        # Constraint 1
+        scipy.optimize.LinearConstraint(
+            scipy.sparse.csr_array((np.ones(num_pairs), (house_of_pair, x)), shape=(num_houses, len(cost))), 1, 1
+        ),
+        # Constraint 2
+        scipy.optimize.LinearConstraint(
+            scipy.sparse.csr_array(
+                (np.concatenate([np.ones(num_pairs), -np.ones(num_pairs)]),
+                 (np.tile(np.arange(num_pairs), 2), np.concatenate([x, site_of_pair]))),
+                shape=(num_pairs, len(cost))
+            ), -np.inf, 0
+        ),
+        # Constraint 3
+        scipy.optimize.LinearConstraint(
+            np.concatenate([np.ones(num_sites), np.zeros(num_pairs)])[np.newaxis, :], num_hospitals, num_hospitals
+        ),
+    ]
+    if upper_bound is not None:
+        # Constraint 4
+        constraints.append(scipy.optimize.LinearConstraint(cost[np.newaxis, :], -np.inf, upper_bound))
+
+    options = dict() if time_limit is None else dict(time_limit=time_limit)
+    result = scipy.optimize.milp(
+        cost,
+        integrality=np.concatenate([np.ones(num_sites), np.zeros(num_pairs)]),
+        bounds=scipy.optimize.Bounds(0, 1),
+        constraints=constraints,
+        options=options
+    )
+    # The lower bound is missing, or nan / inf if the solver was stopped before it found one.
+    lower_bound = getattr(result, "mip_dual_bound", None)
+    if lower_bound is not None and not np.isfinite(lower_bound):
+        lower_bound = None
+    if result.x is None:
+        return None, None, lower_bound
+    chosen = np.argsort(-result.x[:num_sites])[:num_hospitals]
+    chosen_cost = int(np.abs(houses[:, np.newaxis, :] - sites[chosen][np.newaxis, :, :]).sum(axis=2).min(axis=1).sum())
+    return chosen, chosen_cost, lower_bound
+
+
+class CostEngine():
+    def __init__(self, houses, hospitals):
+        """Create the cache for houses and hospitals (iterables of (row, col))."""
+        self.houses = np.array(sorted(houses), dtype=np.int64).reshape(-1, 2)
+        self.hospitals = np.array(list(hospitals), dtype=np.int64).reshape(-1, 2)
+        self.nearest = np.zeros(len(self.houses), dtype=np.int64)
+        self.nearest_distance = np.zeros(len(self.houses), dtype=np.int64)
+        self.second = np.zeros(len(self.houses), dtype=np.int64)
+        self.second_distance = np.zeros(len(self.houses), dtype=np.int64)
+        self.refresh(np.arange(len(self.houses)))
+
+    @property
+    def cost(self):
+        """Sum of distances from houses to the nearest hospital."""
+        return int(self.nearest_distance.sum())
+
+    def positions(self):
+        """Return the hospital positions as a list of (row, col) tuples, in the order of their indices."""
+        return [tuple(hospital) for hospital in self.hospitals.tolist()]
+
+    def distances(self, position):
+        """Return the manhattan distances from all houses to a position."""
+        return np.abs(self.houses - np.asarray(position, dtype=np.int64)).sum(axis=1)
+
+    def refresh(self, rows):
+        """Recompute the nearest and second-nearest hospital of the houses with the given indices."""
+        if not len(rows):
+            return
+        # distances[house, hospital]
+        distances = np.abs(self.houses[rows, np.newaxis, :] - self.hospitals[np.newaxis, :, :]).sum(axis=2)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :2]
+        self.nearest[rows] = order[:, 0]
+        self.nearest_distance[rows] = np.take_along_axis(distances, order[:, :1], axis=1)[:, 0]
+        if len(self.hospitals) > 1:
+            self.second[rows] = order[:, 1]
+            self.second_distance[rows] = np.take_along_axis(distances, order[:, 1:2], axis=1)[:, 0]
+        else:
+            self.second[rows] = -1
+            self.second_distance[rows] = NO_HOSPITAL
+
+    def moveDelta(self, index, position):
+        """Return the change of the cost if the hospital with the given index is moved to position."""
+        return int(self.moveDeltas([index], [position])[0])
+
+    def moveDeltas(self, indices, positions, max_elements=2 ** 22):
+        """
+        Return the change of the cost for every move of a hospital (indices) to a position (array of shape (moves, 2)).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        deltas = np.empty(len(indices), dtype=np.int64)
+        for rows in chunks(len(indices), len(self.houses), max_elements):
+            # distance[move, house]
+            distance = np.abs(self.houses[np.newaxis, :, :] - positions[rows, np.newaxis, :]).sum(axis=2)
+            other = np.where(
+                self.nearest[np.newaxis, :] == indices[rows, np.newaxis],
+                self.second_distance, self.nearest_distance
+            )
+            deltas[rows] = (np.minimum(other, distance) - self.nearest_distance).sum(axis=1)
+        return deltas
+
+    def move(self, index, position):
+        """Move the hospital with the given index to position and update the cache."""
+        distance = self.distances(position)
+        self.hospitals[index] = position
+        stale = (self.nearest == index) | (self.second == index)
+
+        # For all other houses, the moved hospital is a new candidate for the nearest or second-nearest hospital.
+        closer = ~stale & (distance < self.nearest_distance)
+        self.second[closer] = self.nearest[closer]
+        self.second_distance[closer] = self.nearest_distance[closer]
+        self.nearest[closer] = index
+        self.nearest_distance[closer] = distance[closer]
+        second = ~stale & ~closer & (distance < self.second_distance)
+        self.second[second] = index
+        self.second_distance[second] = distance[second]
+
+        self.refresh(np.flatnonzero(stale))
@@ -0,0 +1,124 @@
+import queue
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Frame Renderer:
+# Drawing the whole grid (and loading the images and the font) for every frame is much slower than the search.
+# The grid with all houses never changes, so it is drawn once as a base image.
+# A frame is updated from the previous one: the cells of hospitals that moved away are restored from the base image,
+# the hospital image is pasted into the cells of hospitals that moved there, and the cost is redrawn.
+# Frames are written by a background thread, so that the search does not wait for PNG or GIF encoding.
+# The queue between the search and the writer has a maximum size, so that a slow writer cannot use unlimited memory.
+# With gif=True, all frames are collected (as palette images) by the writer and saved as one animated GIF
+# when the renderer is closed, because PIL cannot append frames to a GIF that was already written.
+
+CELL_SIZE = 100
+CELL_BORDER = 2
+COST_SIZE = 40
+PADDING = 10
+
+
+class FrameRenderer():
+    def __init__(self, space, image_prefix=None, gif=False, duration=200, max_queued=32):
+        """
+        Create a renderer for the houses of space.
+        Frames are written to {image_prefix}000.png, {image_prefix}001.png, ..., or to {image_prefix}.gif if gif is set.
+        Without image_prefix, frames can only be drawn (see draw).
+        """
+        self.space = space
+        self.image_prefix = image_prefix
+        self.gif = gif
+        self.duration = duration
+        self.count = 0
+
+        # Images are resized to fit inside the cell borders, so that a cell can be restored on its own.
+        icon_size = (CELL_SIZE - 2 * CELL_BORDER, CELL_SIZE - 2 * CELL_BORDER)
+        self.hospital = Image.open("assets/images/Hospital.png").convert("RGBA").resize(icon_size)
+        house = Image.open("assets/images/House.png").convert("RGBA").resize(icon_size)
+        self.font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 30)
+
+        # Create the base image: all cells, houses and an empty cost bar
+        self.base = Image.new(
+            "RGBA",
+            (space.width * CELL_SIZE, space.height * CELL_SIZE + COST_SIZE + PADDING * 2),
+            "white"
+        )
+        draw = ImageDraw.Draw(self.base)
+        for i in range(space.height):
+            for j in range(space.width):
+                draw.rectangle(self.cell(i, j), fill="black")
+        for i, j in space.houses:
+            self.base.paste(house, self.cell(i, j)[:2], house)
+        self.cost_box = (0, space.height * CELL_SIZE, space.width * CELL_SIZE, self.base.height)
+        draw.rectangle(self.cost_box, "black")
+
+        self.frame = self.base.copy()
+        self.drawn = set()
+
+        self.queue = None
+        if image_prefix is not None:
+            self.frames = []
+            self.queue = queue.Queue(maxsize=max_queued)
+            self.writer = threading.Thread(target=self.writeFrames, daemon=True)
+            self.writer.start()
+
+    def cell(self, i, j):
+        """Returns the box (left, top, right, bottom) inside the borders of a cell."""
+        return (
+            j * CELL_SIZE + CELL_BORDER,
+            i * CELL_SIZE + CELL_BORDER,
+            (j + 1) * CELL_SIZE - CELL_BORDER,
+            (i + 1) * CELL_SIZE - CELL_BORDER
+        )
+
+    def draw(self, hospitals, cost):
+        """Updates the current frame to show hospitals and cost. Returns the frame."""
+        hospitals = set(hospitals)
+        for i, j in self.drawn - hospitals:
+            box = self.cell(i, j)
+            self.frame.paste(self.base.crop(box), box[:2])
+        for i, j in hospitals - self.drawn:
+            self.frame.paste(self.hospital, self.cell(i, j)[:2], self.hospital)
+        self.drawn = hospitals
+
+        self.frame.paste(self.base.crop(self.cost_box), self.cost_box[:2])
+        ImageDraw.Draw(self.frame).text(
+            (PADDING, self.space.height * CELL_SIZE + PADDING),
+            f"Cost: {cost}",
+            fill="white",
+            font=self.font
+        )
+        return self.frame
+
+    def write(self, hospitals, cost):
+        """Draws a frame and passes a copy of it to the writer thread."""
+        self.queue.put(self.draw(hospitals, cost).copy())
+
+    def writeFrames(self):
+        """Writes the frames from the queue until None is received (runs in the writer thread)."""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.gif:
+                self.frames.append(frame.convert("RGB").quantize(method=Image.Quantize.FASTOCTREE))
+            else:
+                frame.save(f"{self.image_prefix}{str(self.count).zfill(3)}.png")
+            self.count += 1
+
+    def close(self):
+        """Waits until all frames are written (and saves the GIF)."""
+        if self.queue is None:
+            return
+        self.queue.put(None)
+        self.writer.join()
+        if self.gif and self.frames:
+            self.frames[0].save(
+                f"{self.image_prefix}.gif",
+                save_all=True,
+                append_images=self.frames[1:],
+                duration=self.duration,
+                loop=0
+            )
+        self.queue = None
@@ -1,3 +1,62 @@
+# Word Index:
+# Every word gets an ID within the words of its length (its index in the sorted list of these words).
+# A set of words of the same length is stored as a bitset: a Python int whose bit k is set if word k is in the set.
+# For every (length, position, letter), the index stores the bitset of words that have the letter at the position.
+# Set operations on bitsets (&, |, ~) work on 64 words per machine instruction,
+# so filtering a domain by a letter is one operation instead of a loop over all words.
+
+
+def popcount(bits):
+    """Return the number of set bits (the number of words in a bitset)."""
+    return bin(bits).count("1")
+
+
+def toBits(ids, size):
+    """Return the bitset of word IDs (all smaller than size)."""
+    # Building the bitset bit by bit with | would copy the growing int for every ID.
+    data = bytearray(size // 8 + 1)
+    for k in ids:
+        data[k >> 3] |= 1 << (k & 7)
+    return int.from_bytes(data, "little")
+
+
+class WordIndex():
+    """Bitsets of words by (length, position, letter)"""
+
+    def __init__(self, words):
+        # words[length]: sorted list of all words of the length (word ID = index in the list)
+        self.words = dict()
+        for word in sorted(words):
+            self.words.setdefault(len(word), []).append(word)
+        self.ids = {
+            length: {word: k for k, word in enumerate(words_of_length)}
+            for length, words_of_length in self.words.items()
+        }
+        # letters[length, position]: dict that maps each letter to the bitset of words with the letter at the position
+        self.letters = dict()
+        for length, words_of_length in self.words.items():
+            for position in range(length):
+                ids = dict()
+                for k, word in enumerate(words_of_length):
+                    ids.setdefault(word[position], []).append(k)
+                self.letters[length, position] = {
+                    letter: toBits(letter_ids, len(words_of_length)) for letter, letter_ids in ids.items()
+                }
+
+    def all(self, length):
+        """Return the bitset of all words of the length."""
+        return (1 << len(self.words.get(length, []))) - 1
+
+    def bit(self, word):
+        """Return the bitset that only contains word."""
+        return 1 << self.ids[len(word)][word]
+
+    def values(self, length, bits):
+        """Return the list of words of the length in a bitset."""
+        words = self.words.get(length, [])
+        return [words[k] for k, bit in enumerate(reversed(bin(bits)[2:])) if bit == "1"]
+
+
 class Variable():
     """Represents a Variable (Sequence of Cells) in the Crossword Puzzle"""
 
@@ -108,31 +167,40 @@ class Crossword():
                             length=length
                         ))
 
-        # Compute overlaps for each variable
-        # For any pair of variables v1, v2, their overlap is either:
-        #    None, if the two variables do not overlap; or
+        # Compile the structure for the solver:
+        # Every variable gets an integer ID (its index in variable_list, ordered by position and direction).
+        # adjacency[a] is the list of IDs of the variables that overlap variable a.
+        # overlap_array[a][b] is None if the variables a and b do not overlap, or
+        # (i, j), where a's ith character overlaps b's jth character.
+        # The overlaps are found by collecting the variables of every cell, instead of comparing all pairs of variables.
+        self.variable_list = sorted(self.variables, key=lambda v: (v.i, v.j, v.direction))
+        self.variable_ids = {var: a for a, var in enumerate(self.variable_list)}
+        cell_variables = dict()
+        for a, var in enumerate(self.variable_list):
+            for k, cell in enumerate(var.cells):
+                cell_variables.setdefault(cell, []).append((a, k))
+        self.overlap_array = [[None] * len(self.variable_list) for _ in self.variable_list]
+        for variables in cell_variables.values():
+            for a, k in variables:
+                for b, l in variables:
+                    if a != b:
+                        self.overlap_array[a][b] = (k, l)
+        self.adjacency = [
+            [b for b, overlap in enumerate(overlaps) if overlap]
+            for overlaps in self.overlap_array
+        ]
+
+        # Overlaps for each pair of overlapping variables v1, v2:
         #    (i, j), where v1's ith character overlaps v2's jth character
         # Each overlap will be present 2 times in the dictionary, from the perspective of both variables.
+        # Pairs of variables that do not overlap are not in the dictionary.
         self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        self.neighbor_sets = dict()
+        for a, var in enumerate(self.variable_list):
+            self.neighbor_sets[var] = frozenset(self.variable_list[b] for b in self.adjacency[a])
+            for b in self.adjacency[a]:
+                self.overlaps[var, self.variable_list[b]] = self.overlap_array[a][b]
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.neighbor_sets[var]
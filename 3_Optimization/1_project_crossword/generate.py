@@ -1,4 +1,5 @@
 import sys
+from collections import deque
 from crossword import *
 
 # Problem:
@@ -20,19 +21,54 @@ from crossword import *
 # and secondarily after the Degree heuristic.
 # Values will be selected after the Least-Constraining Values heuristic.
 
+# Domains are stored as bitsets of word IDs (see WordIndex in crossword.py).
+# To revise the domain of var1 with respect to var2, the words of var2's domain are grouped by the letter
+# in the overlapping cell: for every letter, (domain of var2) & (words with the letter in the overlapping cell).
+# A word of var1 is supported if this bitset is not empty for its letter in the overlapping cell.
+# So a revision needs one bitset operation per letter, instead of comparing every pair of words.
+# (If the only supporting word is the word itself, it is not supported, because words cannot be used twice.)
+
+# Trail:
+# Every change of a domain is recorded on a trail (undo log) as (variable, previous domain, previous size).
+# Before an assignment, backtrack remembers the length of the trail (a checkpoint).
+# To undo the assignment, the entries after the checkpoint are popped and the previous domains restored.
+# So assigning and undoing only cost as much as the number of domains that actually changed.
+# The number of values in every domain is kept up to date as well, so that MRV doesn't count them for every node.
+
+# Inside the solver, variables are integer IDs (see Crossword.variable_list). Domains and sizes are lists indexed
+# by the ID, and the neighbors and overlaps are read from the precomputed Crossword.adjacency and overlap_array.
+# solve returns the assignment with Variable objects as keys.
+
+# AC-3 Queue:
+# The arcs to revise are kept in a deque (removing the first arc of a list moves all other arcs),
+# and the arcs currently in the queue in a set, so that checking if an arc is already enqueued doesn't scan the queue.
+# Residual Supports (AC-3.1 / AC-2001):
+# For every arc (x, y) and letter, the word of y that last supported the letter in the overlapping cell is remembered.
+# If that word is still in the domain of y, the letter is still supported and the bitsets don't need to be intersected.
+# With bitset domains, checking the residual support costs about as much as the intersection itself,
+# so residual supports are optional (off by default).
+
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, residual_supports=False):
         """
         Create new CSP crossword generate.
+        If residual_supports is set, revise remembers the last supporting word for every arc and letter.
         """
         # Crossword object
         self.crossword = crossword
-        # Initialize the domain for each variable as the full word list
-        self.domains = {
-            var: self.crossword.words.copy()
-            for var in self.crossword.variables
-        }
+        # Bitsets of the words by length, position and letter
+        self.index = WordIndex(self.crossword.words)
+        # Length of each variable (by ID)
+        self.lengths = [var.length for var in self.crossword.variable_list]
+        # Initialize the domain for each variable as the bitset of all words of its length
+        self.domains = [self.index.all(length) for length in self.lengths]
+        # Number of values in each domain
+        self.sizes = [popcount(domain) for domain in self.domains]
+        # Undo log of domain changes (see setDomain and undo)
+        self.trail = []
+        # Last supporting word ID for (var1, var2, letter), or None if residual supports are not used
+        self.supports = dict() if residual_supports else None
 
     def letterGrid(self, assignment):
         """
@@ -104,6 +140,29 @@ class CrosswordCreator():
 
         img.save(filename)
 
+    def domainValues(self, var):
+        """
+        Return the list of words in the domain of var.
+        """
+        return self.index.values(self.lengths[var], self.domains[var])
+
+    def setDomain(self, var, domain):
+        """
+        Change the domain of var and record the previous domain on the trail.
+        """
+        self.trail.append((var, self.domains[var], self.sizes[var]))
+        self.domains[var] = domain
+        self.sizes[var] = popcount(domain)
+
+    def undo(self, checkpoint):
+        """
+        Restore all domains that were changed after the trail had the length checkpoint.
+        """
+        while len(self.trail) > checkpoint:
+            var, domain, size = self.trail.pop()
+            self.domains[var] = domain
+            self.sizes[var] = size
+
     def solve(self):
         """
         Enforce node and arc consistency, and then solve the CSP.
@@ -111,93 +170,108 @@ class CrosswordCreator():
         self.enforceNodeConsistency()
         if not self.ac3():
             return None
-        return self.backtrack(dict())
+        # The changes of node and arc consistency are never undone.
+        self.trail = []
+        assignment = self.backtrack(dict())
+        if assignment is None:
+            return None
+        return {self.crossword.variable_list[var]: value for var, value in assignment.items()}
 
     def enforceNodeConsistency(self):
         """
         Updates `self.domains` such that each variable is node-consistent.
         Removes any values that are inconsistent with a variable's unary constraints;
         in this case, the length of the word.
+        (A domain bitset only contains words of one length, so only words of the variable's length are kept.)
         """
-        for var in self.crossword.variables:
-            self.domains[var] = set(value for value in self.domains[var] if len(value) == var.length)
+        for var, length in enumerate(self.lengths):
+            self.setDomain(var, self.domains[var] & self.index.all(length))
 
-    def revise(self, var1, var2, inferences_domain=None):
+    def revise(self, var1, var2):
         """
         Make variable var1 arc consistent with variable var2.
         Removes values from self.domains[var1] for which there is no possible corresponding value
         for var2 in self.domains[var2] that doesn't cause a conflict.
         A conflict is a cell for which two variables disagree on what character value it should take on.
         Returns True if a revision was made to the domain of var1; return False otherwise.
-        If inferences_domain (dict) is specified,
-        it will contain a set of the removed values for each variable (key).
+        The previous domain is recorded on the trail.
         """
-        is_revised = False
-        overlap = self.crossword.overlaps[var1, var2]
+        overlap = self.crossword.overlap_array[var1][var2]
         if not overlap:
-            return is_revised
-        remove_values = set()
-        for word1 in self.domains[var1]:
-            is_conflict = True
-            for word2 in self.domains[var2]:
-                # There is no conflict if both words are different (same words are not allowed) and
-                # they both have the same character for the overlapping cell.
-                if word1 != word2 and word1[overlap[0]] == word2[overlap[1]]:
-                    is_conflict = False
-                    break
-            if is_conflict:
-                remove_values.add(word1)
+            return False
+        domain1 = self.domains[var1]
+        domain2 = self.domains[var2]
+        letters2 = self.index.letters.get((self.lengths[var2], overlap[1]), dict())
+        same_length = self.lengths[var1] == self.lengths[var2]
+        remove_values = 0
+        for letter, words1 in self.index.letters.get((self.lengths[var1], overlap[0]), dict()).items():
+            words1 &= domain1
+            if not words1:
+                continue
+            if self.supports is not None:
+                support = self.supports.get((var1, var2, letter))
+                # The residual support is still in the domain of var2 and supports all words of var1 with the letter
+                # (unless the support is one of these words itself, then it needs another supporting word).
+                if support is not None and domain2 >> support & 1 and not (same_length and words1 >> support & 1):
+                    continue
+            # Words of var2 that have the same character for the overlapping cell
+            words2 = domain2 & letters2.get(letter, 0)
+            if words2 and self.supports is not None:
+                self.supports[var1, var2, letter] = (words2 & -words2).bit_length() - 1
+            if not words2:
+                remove_values |= words1
+            elif same_length and not words2 & (words2 - 1):
+                # There is only one such word. It is no support for itself (same words are not allowed).
+                remove_values |= words1 & words2
 
         # When used within ac3, revise() may be invoked multiple times to revise the same Variable.
-        for word in remove_values:
-            is_revised = True
-            self.domains[var1].remove(word)
-
-            if inferences_domain:
-                inferences_domain[var1].add(word)
-
-        return is_revised
+        if not remove_values:
+            return False
+        self.setDomain(var1, domain1 & ~remove_values)
+        return True
 
-    def ac3(self, arcs=None, assignment=None, inferences_domain=None):
+    def ac3(self, arcs=None, assignment=None):
         """
         Updates `self.domains` such that each variable is arc consistent,
         ensuring that binary constraints are satisfied.
         If `arcs` is None, all arcs in the problem are made consistent.
         Otherwise, `arcs` is used as the initial list of arcs to make consistent.
-        Each arc is a tuple (x, y) of a variable x and a different variable y.
+        Each arc is a tuple (x, y) of a variable ID x and a different variable ID y.
         Returns True if arc consistency is enforced and no domains are empty;
         returns False if one or more domains end up empty.
-        `assignment` and `inferences_domain` are used for maintaining arc-consistency
-        inside backtracking search (see inference function).
+        `assignment` is used for maintaining arc-consistency inside backtracking search (see inference function).
         """
 
-        # Use list as queue where items get enqueued at the end and dequeued at the beginning.
-        queue = []
+        # Use deque as queue where items get enqueued at the end and dequeued at the beginning.
+        # in_queue contains the arcs that are currently in the queue.
         if not arcs:
             # Enqueue all arcs
-            for var in self.crossword.variables:
-                neighbors = self.crossword.neighbors(var)
-                for neighbor in neighbors:
-                    queue.append((var, neighbor))
-        else:
-            queue = arcs
+            arcs = [
+                (var, neighbor)
+                for var, neighbors in enumerate(self.crossword.adjacency)
+                for neighbor in neighbors
+            ]
+        queue = deque(dict.fromkeys(arcs))
+        in_queue = set(queue)
 
         while queue:
-            (var1, var2) = queue.pop(0)
-            if self.revise(var1, var2, inferences_domain):
-                if len(self.domains[var1]) == 0:
+            (var1, var2) = queue.popleft()
+            in_queue.remove((var1, var2))
+            if self.revise(var1, var2):
+                if not self.domains[var1]:
                     # CSP is unsolvable
                     return False
                 # since var1's domain was changed, all associated arcs must be checked for consistency.
                 # arc (var2, var1) does not need to be checked, because for the revision of var2's domain
                 # it doesn't matter if the removed incompatible values from var1's domain are there or not.
-                for neighbor in self.crossword.neighbors(var1) - set([var2]):
+                for neighbor in self.crossword.adjacency[var1]:
                     # Do not revise a Variable that is already assigned.
-                    if assignment and neighbor in assignment:
+                    if neighbor == var2 or assignment and neighbor in assignment:
                         continue
                     arc = (neighbor, var1)
-                    if arc not in queue:
+                    if arc not in in_queue:
                         queue.append(arc)
+                        in_queue.add(arc)
 
         return True
 
@@ -205,22 +279,17 @@ class CrosswordCreator():
         """
         Called in the backtrack function after assigning a variable to a value to maintain arc-consistency
         and to make inferences about additional assignments that can be made.
-        `var` is the Variable that was just assigned. `assignment` is the current assignment dict.
-        Returns `inferences` and `inferences_domain`. `inferences_domain` is a dict that maps variables (keys)
-        to a set of values that got removed from the domain of the variable during this function call.
-        `inferences` is a dict that maps variables (keys) to values. The content of this dict can be added to
+        `var` is the ID of the Variable that was just assigned. `assignment` is the current assignment dict.
+        Returns `inferences`, a dict that maps variables (keys) to values. The content of this dict can be added to
         `assignment` to speed up the assignment process.
-        The changes that this function does to the domain of variables must be reverted again if there is a
-        backtrack (when an assignment got reverted).
+        The changes that this function does to the domain of variables are recorded on the trail.
+        They must be reverted again (see undo) if there is a backtrack (when an assignment got reverted).
         """
         inferences = dict()
-        inferences_domain = {
-            var_inf: set() for var_inf in self.crossword.variables
-        }
+        checkpoint = len(self.trail)
         # For the currently assigned variable, set its domain to the assigned value.
         # Only then ac3 can find new values to be removed from other domains.
-        inferences_domain[var] = self.domains[var] - set([assignment[var]])
-        self.domains[var] = set([assignment[var]])
+        self.setDomain(var, self.index.bit(assignment[var]))
 
         # It's optional to remove the assigned value from the domain of all other variables.
         # Because duplicated words are restricted in all other parts of the program anyways.
@@ -228,28 +297,29 @@ class CrosswordCreator():
         # Get arcs that ac3 should be initialized with. The assignment of a variable only initially impacts
         # its neighbors that are not assigned yet (ac3 will further enqueue others that are impacted).
         arcs = []
-        for neighbor in self.crossword.neighbors(var):
+        for neighbor in self.crossword.adjacency[var]:
             if neighbor not in assignment:
                 arcs.append((neighbor, var))
 
         # If ac3 returns False, the next recursion level of backtrack will use the variable that has
         # an empty domain (because of MRV heuristic). Since this variable cannot have an assignment,
         # backtrack goes back one recursion level.
-        if self.ac3(arcs, assignment, inferences_domain):
+        if self.ac3(arcs, assignment):
             # populate inferences dict.
             # An inference can be made if the domain of an unassigned variable has only 1 value.
-            for var_inf in self.crossword.variables:
-                if var_inf not in assignment and len(self.domains[var_inf]) == 1:
-                    inferences[var_inf] = list(self.domains[var_inf])[0]
+            # Only the variables whose domain changed (the entries on the trail) need to be checked.
+            for var_inf, _, _ in self.trail[checkpoint:]:
+                if var_inf not in assignment and var_inf not in inferences and self.sizes[var_inf] == 1:
+                    inferences[var_inf] = self.domainValues(var_inf)[0]
 
-        return inferences, inferences_domain
+        return inferences
 
     def assignmentComplete(self, assignment):
         """
         Returns True if `assignment` is complete, False otherwise.
         An Assignment is complete if every variable is assigned to a value.
         """
-        for var in self.crossword.variables:
+        for var in range(len(self.lengths)):
             if not assignment.get(var):
                 return False
         return True
@@ -263,7 +333,7 @@ class CrosswordCreator():
         for var in assignment:
             value = assignment[var]
             # words should fit in the sequence of cells
-            if len(value) != var.length:
+            if len(value) != self.lengths[var]:
                 return False
             # words should not be duplicated
             if value in values_assigned:
@@ -271,10 +341,10 @@ class CrosswordCreator():
             values_assigned.append(value)
             # Neighboring variables should not have conflicts.
             # (Neighbors are checked twice here, 1 time in each direction, which is a bit inefficient)
-            for neighbor in self.crossword.neighbors(var):
+            for neighbor in self.crossword.adjacency[var]:
                 neighbor_value = assignment.get(neighbor)
                 if neighbor_value:
-                    overlap = self.crossword.overlaps[var, neighbor]
+                    overlap = self.crossword.overlap_array[var][neighbor]
                     if value[overlap[0]] != neighbor_value[overlap[1]]:
                         return False
         return True
@@ -287,19 +357,27 @@ class CrosswordCreator():
         """
         # For each value in the domain of var, count the number of conflicting values
         # in the domain of every unassigned neighbor.
+        values = self.domainValues(var)
         values_constraints = {
-            val: 0 for val in self.domains[var]
+            val: 0 for val in values
         }
 
-        for value in self.domains[var]:
-            for neighbor in self.crossword.neighbors(var):
-                if neighbor not in assignment:
-                    overlap = self.crossword.overlaps[var, neighbor]
-                    for neighbor_value in self.domains[neighbor]:
-                        # There is a conflict if both words are the same or
-                        # they both have a different character for the overlapping cell.
-                        if value == neighbor_value or value[overlap[0]] != neighbor_value[overlap[1]]:
-                            values_constraints[value] += 1
+        for neighbor in self.crossword.adjacency[var]:
+            if neighbor not in assignment:
+                overlap = self.crossword.overlap_array[var][neighbor]
+                neighbor_domain = self.domains[neighbor]
+                num_values = popcount(neighbor_domain)
+                # Number of values of the neighbor with each character in the overlapping cell
+                num_matching = {
+                    letter: popcount(neighbor_domain & words)
+                    for letter, words in self.index.letters.get((self.lengths[neighbor], overlap[1]), dict()).items()
+                }
+                for value in values:
+                    # There is a conflict if both words are the same or
+                    # they both have a different character for the overlapping cell.
+                    values_constraints[value] += num_values - num_matching.get(value[overlap[0]], 0)
+                    if self.lengths[neighbor] == self.lengths[var] and neighbor_domain & self.index.bit(value):
+                        values_constraints[value] += value[overlap[0]] == value[overlap[1]]
         
         # Sort the values after the number of conflicts in ascending order.
         ordered_domain = sorted(values_constraints, key = lambda x: values_constraints[x])
@@ -307,7 +385,7 @@ class CrosswordCreator():
 
     def selectUnassignedVariable(self, assignment):
         """
-        Returns an unassigned variable not already part of `assignment`.
+        Returns the ID of an unassigned variable not already part of `assignment`.
         All variables are ordered primarily after the Minimum Remaining Values (MRV) heuristic
         and secondarily after the Degree heuristic.
         MRV heuristic: Choose the variable with the least amount of values in its domain.
@@ -316,39 +394,25 @@ class CrosswordCreator():
         Degree heuristic: Choose the variable with the most unassigned neighbors.
         The goal is to constrain many other variables to speed up the algorithm.
         """
-        # construct a list that contains the following tuples:
-        # (Variable object, number of values in Variable domain, number of unassigned neighbors for the Variable)
-        vars = []
-        for var in self.crossword.variables:
-            if var not in assignment:
-                vars.append(
-                    (var, len(self.domains[var]), len(self.crossword.neighbors(var) - set(assignment)))
-                )
-
-        # First order after the number of values in Variable domain, ascending order.
-        ordered_vars = sorted(vars, key = lambda x: x[1])
-        num_tied = 0
-        for var in ordered_vars:
-            num_tied += 1
-            if var[1] != ordered_vars[0][1]:
-                break
-        
-        # Take the Variables that have the same number of values in their domain.
-        # Order after the number of neighbors, descending order
-        ordered_vars = ordered_vars[:num_tied]
-        ordered_vars = sorted(ordered_vars, key = lambda x: x[2], reverse=True)
+        # The number of values in each domain is kept in self.sizes.
+        # The number of unassigned neighbors is only counted for the variables with the fewest values.
+        unassigned = [var for var in range(len(self.lengths)) if var not in assignment]
+        min_size = min(self.sizes[var] for var in unassigned)
 
         # Select the Variable with the least amount of values in its domain and with the most neighbors.
-        return ordered_vars[0][0]
+        return max(
+            (var for var in unassigned if self.sizes[var] == min_size),
+            key=lambda var: sum(1 for neighbor in self.crossword.adjacency[var] if neighbor not in assignment)
+        )
 
     def backtrack(self, assignment):
         """
         Runs Backtracking Search on a partial assignment for the
         crossword and returns a complete assignment if possible to do so.
         If no full assignment is possible, returns None.
-        `assignment` is a dict that maps variables (keys) to words (values).
+        `assignment` is a dict that maps variable IDs (keys) to words (values).
         """
-        if len(assignment) == len(self.crossword.variables):
+        if len(assignment) == len(self.lengths):
             return assignment
 
         var = self.selectUnassignedVariable(assignment)
@@ -356,7 +420,8 @@ class CrosswordCreator():
             assignment[var] = value
             if self.consistent(assignment):
                 # apply inferences obtained by maintaining arc-consistency with ac3.
-                inferences, inferences_domain = self.inference(assignment, var)
+                checkpoint = len(self.trail)
+                inferences = self.inference(assignment, var)
                 assignment.update(inferences)
                 result = self.backtrack(assignment)
                 if result is not None:
@@ -365,8 +430,7 @@ class CrosswordCreator():
                 # Remove inferences again, if there was a backtrack (if went up recursion level).
                 for var_inf in inferences:
                     assignment.pop(var_inf)
-                for var_inf in inferences_domain:
-                    self.domains[var_inf].update(inferences_domain[var_inf])
+                self.undo(checkpoint)
 
             # Remove assignment if the value didn't work out
             assignment.pop(var)